@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+
+"""Process Music benchmarks. Time the pipeline and the startup of the CLI on the bundled examples and on synthetic MIDI files
+
+Usage:
+    benchmark.py [--notes NOTES] [--tracks TRACKS] [--repeat REPEAT] [--work_dir WORK_DIR] [--output OUTPUT] [--save] [--compare BASELINE] [--tolerance TOLERANCE] [--no_examples]
+    benchmark.py (-h | --help)
+
+Options:
+    -h --help                 Show help.
+    --notes NOTES             The number of notes of each track of the synthetic MIDI file, zero skips it [default: 20000].
+    --tracks TRACKS           The number of note tracks of the synthetic MIDI file [default: 4].
+    --repeat REPEAT           The number of runs of each benchmark, the fastest one counts [default: 3].
+    --work_dir WORK_DIR       The directory for synthetic MIDI files and logs [default: bench_work].
+    --output OUTPUT           The path of the JSON results [default: bench_results.json].
+    --save                    Store the results as baseline of the current version in benchmarks/baselines.
+    --compare BASELINE        Compare the results with a stored baseline and report regressions.
+    --tolerance TOLERANCE     The relative loss of events/sec tolerated before a benchmark counts as regression [default: 0.2].
+    --no_examples             Skip the bundled examples.
+
+Run with python -O, otherwise the debug output of the pipeline is part of the measurement.
+
+Copyright:
+    (c) by K-u-K (imperial Keller Patrick & royal Kocaj Alen) 2020
+"""
+from docopt import docopt
+from schema import Schema, And, Use, Or, SchemaError
+
+import contextlib
+import datetime
+import glob
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR       = os.path.dirname(BENCHMARKS_DIR)
+BASELINES_DIR  = os.path.join(BENCHMARKS_DIR, "baselines")
+
+sys.path.insert(0, os.path.join(ROOT_DIR, "process_music"))
+
+import constants
+import footprint
+import midi
+import process_music
+import processor
+import utils
+import xes
+
+import generate_midi
+
+def measure(function, repeat):
+    # the fastest of all runs counts, the peak memory is taken from an extra run as tracing slows it down
+    seconds = float("inf")
+    for _ in range(repeat):
+        start   = time.perf_counter()
+        function()
+        seconds = min(seconds, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return seconds, peak_memory
+
+def measure_startup(repeat):
+    # wall time of a fresh interpreter showing the version, i.e. the cost of the imports of the CLI
+    script  = os.path.join(ROOT_DIR, "process_music", "process_music.py")
+    seconds = float("inf")
+    for _ in range(repeat):
+        start   = time.perf_counter()
+        subprocess.run([sys.executable, "-O", script, "--version"], stdout=subprocess.DEVNULL, check=True)
+        seconds = min(seconds, time.perf_counter() - start)
+
+    return seconds
+
+def create_result(events, seconds, peak_memory):
+    return {
+        "events":            events,
+        "seconds":           seconds,
+        "events_per_second": events / seconds if seconds > 0 else None,
+        "peak_memory":       peak_memory
+    }
+
+def get_durations(filename):
+    # all note and pause lengths of a file, as they are handed to the classifiers
+    reader    = midi.MidiReader(filename)
+    durations = []
+    pauses    = []
+    for track in reader.tracks:
+        for msg in track:
+            if msg.type not in constants.NOTE_EVENTS:
+                continue
+
+            if msg.type == constants.NOTE_OFF or msg.velocity == 0:
+                durations.append(msg.time)
+            elif msg.time != 0:
+                pauses.append(msg.time)
+
+    return reader.ticks_per_beat, durations, pauses
+
+def read_events(filename):
+    # turn a written track log back into the events handed to the XES writer and the footprint engine
+    events = []
+    start  = None
+    with open(filename) as fh:
+        next(fh)
+        for line in fh:
+            case, key, note_type, order, is_chord, timestamp = line.rstrip("\n").split(";")
+            timestamp = datetime.datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%f")
+            if start is None:
+                start = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+            events.append(processor.Event(
+                case     = int(case),
+                key      = key,
+                type     = note_type,
+                order    = int(order),
+                is_chord = is_chord == "True",
+                time     = (timestamp - start) // datetime.timedelta(microseconds=1),
+                bar      = None
+            ))
+
+    return events, start
+
+def benchmark_file(filename, work_dir, repeat):
+    name       = os.path.splitext(os.path.basename(filename))[0].lower()
+    output_dir = os.path.join(work_dir, name)
+    results    = {}
+
+    run = lambda profile=False: process_music.process_file(filename, output_dir, profile=profile)
+    with contextlib.redirect_stdout(io.StringIO()):
+        summary         = run()
+        seconds, memory = measure(run, repeat)
+        stages          = run(profile=True)["profile"]["stages"]
+
+    events = sum(summary["events"].values())
+    results[f"process_music:{name}"] = create_result(events, seconds, memory)
+
+    # the CSV alone skips the XES export and the footprint, a separate directory keeps the other logs
+    csv_only = lambda: process_music.process_file(filename, os.path.join(work_dir, f"{name}_csv"), formats=[constants.FORMAT_CSV])
+    with contextlib.redirect_stdout(io.StringIO()):
+        seconds, memory = measure(csv_only, repeat)
+    results[f"process_music_csv:{name}"] = create_result(events, seconds, memory)
+
+    tracks   = [read_events(csv) for csv in sorted(glob.glob(os.path.join(output_dir, "track_*.csv")))]
+    xes_file = os.path.join(work_dir, "benchmark.xes")
+
+    seconds, memory = measure(lambda: [xes.export_to_xes(track, xes_file, start) for track, start in tracks], repeat)
+    results[f"xes:{name}"] = create_result(events, seconds, memory)
+
+    seconds, memory = measure(lambda: [footprint.calculate_footprint_matrix(track) for track, _ in tracks], repeat)
+    results[f"footprint:{name}"] = create_result(events, seconds, memory)
+
+    ticks_per_beat, durations, pauses = get_durations(filename)
+    with contextlib.redirect_stdout(io.StringIO()):
+        seconds, memory = measure(lambda: utils.get_note_types(durations, ticks_per_beat), repeat)
+        results[f"note_types:{name}"] = create_result(len(durations), seconds, memory)
+
+        seconds, memory = measure(lambda: utils.get_note_types_pause(pauses, ticks_per_beat), repeat)
+        results[f"note_types_pause:{name}"] = create_result(len(pauses), seconds, memory)
+
+    return results, stages
+
+def compare(results, baseline, tolerance):
+    # a benchmark regressed if it handles considerably less events per second than in the baseline
+    regressions = []
+    for name, result in results.items():
+        reference = baseline["benchmarks"].get(name)
+        if reference is None or not reference["events_per_second"] or not result["events_per_second"]:
+            continue
+
+        ratio = result["events_per_second"] / reference["events_per_second"]
+        if ratio < 1 - tolerance:
+            regressions.append((name, ratio))
+
+    return regressions
+
+def main(args):
+    work_dir = args["--work_dir"]
+    if not os.path.exists(work_dir):
+        os.makedirs(work_dir)
+
+    filenames = [] if args["--no_examples"] else sorted(glob.glob(os.path.join(ROOT_DIR, "examples", "*.mid")))
+    if args["--notes"] > 0:
+        synthetic = os.path.join(work_dir, f"synthetic_{args['--tracks']}x{args['--notes']}.mid")
+        generate_midi.generate_midi(synthetic, tracks=args["--tracks"], notes=args["--notes"])
+        filenames.append(synthetic)
+
+    report = {
+        "version":    constants.VERSION,
+        "python":     platform.python_version(),
+        "platform":   platform.platform(),
+        "created":    datetime.datetime.now().isoformat(),
+        "startup":    measure_startup(args["--repeat"]),
+        "benchmarks": {},
+        "stages":     {},
+        "errors":     {}
+    }
+
+    for filename in filenames:
+        try:
+            results, stages = benchmark_file(filename, work_dir, args["--repeat"])
+        except Exception as e:
+            report["errors"][os.path.basename(filename)] = f"{type(e).__name__}: {e}"
+            print(f"{filename}: failed ({type(e).__name__}: {e})")
+            continue
+
+        report["benchmarks"].update(results)
+        report["stages"][os.path.basename(filename)] = stages
+
+    print(f"Startup of process_music.py: {report['startup']:.4f}s")
+    print(f"{'benchmark':<50} {'events':>10} {'seconds':>10} {'events/sec':>14} {'peak memory':>14}")
+    for name, result in report["benchmarks"].items():
+        print(f"{name:<50} {result['events']:>10} {result['seconds']:>10.4f} {result['events_per_second'] or 0:>14.0f} {result['peak_memory']:>14}")
+
+    with open(args["--output"], "w") as fh:
+        json.dump(report, fh, indent=2)
+
+    if args["--save"]:
+        if not os.path.exists(BASELINES_DIR):
+            os.makedirs(BASELINES_DIR)
+
+        baseline = os.path.join(BASELINES_DIR, f"{constants.VERSION}.json")
+        with open(baseline, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Baseline stored in '{baseline}'")
+
+    if args["--compare"] is not None:
+        with open(args["--compare"]) as fh:
+            regressions = compare(report["benchmarks"], json.load(fh), args["--tolerance"])
+
+        for name, ratio in regressions:
+            print(f"Regression: {name} runs at {ratio:.0%} of the baseline events/sec")
+
+        if len(regressions) > 0:
+            sys.exit(1)
+
+        print(f"No regressions compared to '{args['--compare']}'")
+
+if __name__ == '__main__':
+    args   = docopt(__doc__)
+    schema = Schema({
+        "--notes": And(Use(int), lambda x: x >= 0, error="Notes should be a positive number"),
+        "--tracks": And(Use(int), lambda x: x >= 1, error="Tracks should be a positive non-zero number"),
+        "--repeat": And(Use(int), lambda x: x >= 1, error="Repeat should be a positive non-zero number"),
+        "--work_dir": str,
+        "--output": str,
+        "--save": bool,
+        "--compare": Or(None, And(os.path.exists, error="BASELINE should exist")),
+        "--tolerance": And(Use(float), lambda x: 0 <= x < 1, error="Tolerance should be between zero and one"),
+        "--no_examples": bool,
+        "--help": bool
+    })
+
+    try:
+        args = schema.validate(args)
+    except SchemaError as e:
+        print("Warning: invalid arguments given", e, "\n")
+        print(__doc__)
+        sys.exit(1)
+
+    main(args)
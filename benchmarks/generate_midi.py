@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+"""Process Music benchmarks. Generate deterministic synthetic MIDI files of any size
+
+Usage:
+    generate_midi.py [--tracks TRACKS] [--notes NOTES] [--chords CHORDS] [--triplets TRIPLETS] [--pauses PAUSES] [--tempo_changes TEMPOS] [--signature_changes SIGNATURES] [--ticks_per_beat TICKS] [--seed SEED] OUTPUT_FILE
+    generate_midi.py (-h | --help)
+
+Options:
+    -h --help                       Show help.
+    --tracks TRACKS                 The number of note tracks next to the conductor track [default: 4].
+    --notes NOTES                   The number of notes of each track [default: 10000].
+    --chords CHORDS                 The probability of a note being a chord of two to four notes [default: 0.2].
+    --triplets TRIPLETS             The probability of a note being the start of a triplet [default: 0.05].
+    --pauses PAUSES                 The probability of a pause before a note [default: 0.1].
+    --tempo_changes TEMPOS          The number of tempo changes of the conductor track [default: 8].
+    --signature_changes SIGNATURES  The number of time signature changes of the conductor track [default: 4].
+    --ticks_per_beat TICKS          The resolution of the file [default: 480].
+    --seed SEED                     The seed of the random generator, the same seed always produces the same file [default: 0].
+
+Copyright:
+    (c) by K-u-K (imperial Keller Patrick & royal Kocaj Alen) 2020
+"""
+from docopt import docopt
+from schema import Schema, And, Use, SchemaError
+
+import mido
+
+import random
+import sys
+
+# note lengths in beats a generated note or pause is drawn from
+NOTE_LENGTHS  = [4, 3, 2, 1.5, 1, 0.75, 0.5, 0.25]
+PAUSE_LENGTHS = [2, 1, 0.5, 0.25]
+
+TEMPOS          = [400000, 500000, 600000, 750000]
+TIME_SIGNATURES = [(4, 4), (3, 4), (6, 8), (2, 4)]
+
+LOWEST_NOTE  = 36
+HIGHEST_NOTE = 84
+
+def generate_conductor_track(rnd, length, tempo_changes, signature_changes):
+    # tempo and time signature changes are spread over the whole length of the song
+    changes = [(0, mido.MetaMessage("set_tempo", tempo=500000, time=0)),
+               (0, mido.MetaMessage("time_signature", numerator=4, denominator=4, time=0))]
+
+    for _ in range(tempo_changes):
+        changes.append((rnd.randrange(length), mido.MetaMessage("set_tempo", tempo=rnd.choice(TEMPOS))))
+
+    for _ in range(signature_changes):
+        numerator, denominator = rnd.choice(TIME_SIGNATURES)
+        changes.append((rnd.randrange(length), mido.MetaMessage("time_signature", numerator=numerator, denominator=denominator)))
+
+    track = mido.MidiTrack()
+    track.append(mido.MetaMessage("track_name", name="Conductor", time=0))
+
+    now = 0
+    for tick, msg in sorted(changes, key=lambda change: change[0]):
+        track.append(msg.copy(time=tick - now))
+        now = tick
+
+    track.append(mido.MetaMessage("end_of_track", time=0))
+    return track
+
+def generate_note_track(rnd, i, notes, ticks_per_beat, chords, triplets, pauses):
+    track = mido.MidiTrack()
+    track.append(mido.MetaMessage("track_name", name=f"Track {i}", time=0))
+
+    pitch  = rnd.randint(LOWEST_NOTE, HIGHEST_NOTE)
+    length = 0
+    count  = 0
+    while count < notes:
+        # pauses are the delta time of the next note_on message
+        pause = 0
+        if rnd.random() < pauses:
+            pause = int(ticks_per_beat * rnd.choice(PAUSE_LENGTHS))
+
+        if rnd.random() < triplets:
+            durations = [ticks_per_beat * 2 // 3] * 3
+        else:
+            durations = [int(ticks_per_beat * rnd.choice(NOTE_LENGTHS))]
+
+        for duration in durations:
+            size = rnd.randint(2, 4) if rnd.random() < chords else 1
+
+            # random walk of the pitch, chords stack thirds and fifths on top of it
+            pitch = min(max(pitch + rnd.randint(-5, 5), LOWEST_NOTE), HIGHEST_NOTE - 12)
+            keys  = [pitch + offset for offset in [0, 4, 7, 12][:size]]
+
+            for j, key in enumerate(keys):
+                track.append(mido.Message("note_on", note=key, velocity=64, time=pause if j == 0 else 0))
+            for j, key in enumerate(keys):
+                track.append(mido.Message("note_off", note=key, velocity=0, time=duration if j == 0 else 0))
+
+            length = length + pause + duration
+            pause  = 0
+            count  = count + size
+
+    track.append(mido.MetaMessage("end_of_track", time=0))
+    return track, length
+
+def generate_midi(filename, tracks=4, notes=10000, chords=0.2, triplets=0.05, pauses=0.1, tempo_changes=8, signature_changes=4, ticks_per_beat=480, seed=0):
+    rnd  = random.Random(seed)
+    midi = mido.MidiFile(type=1, ticks_per_beat=ticks_per_beat)
+
+    note_tracks = [generate_note_track(rnd, i + 1, notes, ticks_per_beat, chords, triplets, pauses) for i in range(tracks)]
+    length      = max([length for _, length in note_tracks] + [1])
+
+    midi.tracks.append(generate_conductor_track(rnd, length, tempo_changes, signature_changes))
+    midi.tracks.extend(track for track, _ in note_tracks)
+    midi.save(filename)
+
+    return sum(sum(1 for msg in track if msg.type == "note_on") for track, _ in note_tracks)
+
+def main(args):
+    notes = generate_midi(
+        args["OUTPUT_FILE"],
+        tracks            = args["--tracks"],
+        notes             = args["--notes"],
+        chords            = args["--chords"],
+        triplets          = args["--triplets"],
+        pauses            = args["--pauses"],
+        tempo_changes     = args["--tempo_changes"],
+        signature_changes = args["--signature_changes"],
+        ticks_per_beat    = args["--ticks_per_beat"],
+        seed              = args["--seed"])
+
+    print(f"Synthetic MIDI file '{args['OUTPUT_FILE']}' with {notes} notes generated")
+
+if __name__ == '__main__':
+    args   = docopt(__doc__)
+    schema = Schema({
+        "OUTPUT_FILE": str,
+        "--tracks": And(Use(int), lambda x: x >= 1, error="Tracks should be a positive non-zero number"),
+        "--notes": And(Use(int), lambda x: x >= 1, error="Notes should be a positive non-zero number"),
+        "--chords": And(Use(float), lambda x: 0 <= x <= 1, error="Chords should be a probability"),
+        "--triplets": And(Use(float), lambda x: 0 <= x <= 1, error="Triplets should be a probability"),
+        "--pauses": And(Use(float), lambda x: 0 <= x <= 1, error="Pauses should be a probability"),
+        "--tempo_changes": And(Use(int), lambda x: x >= 0, error="Tempo changes should be a positive number"),
+        "--signature_changes": And(Use(int), lambda x: x >= 0, error="Time signature changes should be a positive number"),
+        "--ticks_per_beat": And(Use(int), lambda x: x >= 1, error="Ticks per beat should be a positive non-zero number"),
+        "--seed": Use(int),
+        "--help": bool
+    })
+
+    try:
+        args = schema.validate(args)
+    except SchemaError as e:
+        print("Warning: invalid arguments given", e, "\n")
+        print(__doc__)
+        sys.exit(1)
+
+    main(args)
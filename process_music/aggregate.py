@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+"""Process Music aggregation. Sum up the directly-follows counts of many tracks to the footprint of a corpus
+
+Usage:
+    aggregate.py [--output_dir DIR] [--name NAME] [--jobs JOBS] [--types] SOURCES...
+    aggregate.py (-h | --help)
+    aggregate.py (-v | --version)
+
+Options:
+    -h --help               Show help.
+    -v --version            Show version information.
+    --output_dir DIR        The directory where the aggregated counts and footprint matrices are stored [default: .].
+    --name NAME             The prefix of the output files, e.g. the name of the corpus or genre [default: corpus].
+    --jobs JOBS             The number of shards summed up in parallel [default: 1].
+    --types                 Additionally write the footprint matrix of the note types.
+
+SOURCES can be directories searched recursively for *_counts.npz files, count files or glob patterns.
+The counts are written with --formats counts of process_music.py and batch.py. The aggregated <name>_counts.npz
+is a count file itself, so e.g. the aggregates of several genres can be summed up to the one of a whole corpus.
+
+Copyright:
+    (c) by K-u-K (imperial Keller Patrick & royal Kocaj Alen) 2020
+"""
+from docopt import docopt
+from schema import Schema, And, Use, SchemaError
+
+import constants
+import footprint
+
+import concurrent.futures
+import glob
+import os
+import sys
+
+COUNTS_SUFFIX = "_counts.npz"
+
+def collect_counts(sources):
+    filenames = []
+    for source in sources:
+        if os.path.isdir(source):
+            candidates = sorted(glob.glob(os.path.join(source, "**", f"*{COUNTS_SUFFIX}"), recursive=True))
+        else:
+            candidates = sorted(glob.glob(source))
+
+        for candidate in candidates:
+            if candidate.endswith(COUNTS_SUFFIX) and candidate not in filenames:
+                filenames.append(candidate)
+
+    return filenames
+
+def reduce_counts(filenames):
+    # a single pass over the count files of a shard
+    total = None
+    for filename in filenames:
+        total = footprint.add_counts(total, footprint.load_counts(filename))
+
+    return total
+
+def aggregate(filenames, jobs=1):
+    # every worker sums up one shard of the count files, the partial sums are added up at the end
+    if jobs == 1 or len(filenames) < 2:
+        return reduce_counts(filenames)
+
+    jobs   = min(jobs, len(filenames))
+    shards = [filenames[i::jobs] for i in range(jobs)]
+
+    total = None
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        for counts in executor.map(reduce_counts, shards):
+            total = footprint.add_counts(total, counts)
+
+    return total
+
+def main(args):
+    output_dir = args["--output_dir"]
+    name       = args["--name"]
+
+    filenames = collect_counts(args["SOURCES"])
+    if len(filenames) == 0:
+        print("No count files found")
+        sys.exit(1)
+
+    counts = aggregate(filenames, args["--jobs"])
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    footprint.save_counts(counts, os.path.join(output_dir, f"{name}{COUNTS_SUFFIX}"))
+    with open(os.path.join(output_dir, f"{name}_footprint_matrix.txt"), "w") as fh:
+        fh.write(footprint.calculate_footprint_symbols(counts["pitches"]).to_string())
+
+    if args["--types"]:
+        with open(os.path.join(output_dir, f"{name}_type_footprint_matrix.txt"), "w") as fh:
+            fh.write(footprint.calculate_footprint_symbols(counts["types"], counts["type_names"]).to_string())
+
+    print(f"{len(filenames)} count files with {counts['tracks']} tracks and {counts['events']} events aggregated in directory '{output_dir}'")
+
+if __name__ == '__main__':
+    args   = docopt(__doc__, version=constants.VERSION)
+    schema = Schema({
+        "SOURCES": [str],
+        "--output_dir": str,
+        "--name": And(str, len, error="Name should not be empty"),
+        "--jobs": And(Use(int), lambda x: x >= 1, error="Jobs should be a positive non-zero number"),
+        "--types": bool,
+        "--version": bool,
+        "--help": bool
+    })
+
+    try:
+        args = schema.validate(args)
+    except SchemaError as e:
+        print("Warning: invalid arguments given", e, "\n")
+        print(__doc__)
+        sys.exit(1)
+
+    main(args)
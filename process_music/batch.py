@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+"""Process Music batch mode. Process a whole corpus of MIDI files with a pool of warm workers
+
+Usage:
+    batch.py [--measures MEASURES] [--output_dir OUTPUT_DIR] [--jobs JOBS] [--manifest MANIFEST] [--gzip] [--per_case] [--cache_dir CACHE_DIR] [--cache_size SIZE] [--profile] [--profile_memory] [--formats FORMATS] [--merge] [--chords] [--split_channels] MIDI_FILES...
+    batch.py (-h | --help)
+    batch.py (-v | --version)
+
+Options:
+    -h --help               Show help.
+    -v --version            Show version information.
+    --measures MEASURES     The number of measures you want to define for a case. Zero defines everything as trace / case.
+                            Comma separated values write one log per granularity into measures_<value> sub directories [default: 1].
+    --output_dir OUTPUT_DIR The directory where a sub directory with the track logs of each song is stored. By default the logs are stored next to each MIDI file.
+    --jobs JOBS             The number of MIDI files processed in parallel [default: 1].
+    --manifest MANIFEST     The path of the summary manifest. By default manifest.json in the output directory.
+    --gzip                  Store the XES logs gzip-compressed (.xes.gz).
+    --per_case              Consider only transitions within a case for the footprint matrix.
+    --cache_dir CACHE_DIR   Reuse the logs of unchanged tracks stored in this cache directory.
+    --cache_size SIZE       The size limit of the cache in megabytes [default: 1024].
+    --profile               Write a profile.json of each MIDI file and aggregate them in the manifest.
+    --profile_memory        Like --profile, additionally record the peak memory (slows down processing).
+    --formats FORMATS       Comma separated outputs written for each track, any of csv, xes, footprint, npz and counts [default: csv,xes,footprint].
+    --merge                 Additionally write the song log of each MIDI file with the events of all tracks merged by time.
+    --chords                Fold the notes of a chord into one event named after the chord, e.g. Em or C7/E for an inversion.
+    --split_channels        Write separate logs track_<i>_channel_<n> for the notes of each MIDI channel of a track.
+
+MIDI_FILES can be MIDI files, directories containing MIDI files or glob patterns.
+
+Copyright:
+    (c) by K-u-K (imperial Keller Patrick & royal Kocaj Alen) 2020
+"""
+from docopt import docopt
+from schema import Schema, And, Use, Or, SchemaError
+
+import constants
+import process_music
+import profiling
+import utils
+
+import concurrent.futures
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import time
+
+MIDI_EXTENSIONS = [".mid", ".midi"]
+
+def collect_midi_files(patterns):
+    filenames = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = sorted(glob.glob(os.path.join(pattern, "*")))
+        else:
+            candidates = sorted(glob.glob(pattern))
+
+        for candidate in candidates:
+            if os.path.splitext(candidate)[1].lower() in MIDI_EXTENSIONS and candidate not in filenames:
+                filenames.append(candidate)
+
+    return filenames
+
+def get_song_output_dir(filename, output_dir):
+    # mirror the layout of process_music.py, i.e. <output_dir>/<song>/track_N.*
+    song = os.path.splitext(filename)[0].lower()
+    if output_dir is None:
+        return song
+
+    return os.path.join(output_dir, os.path.basename(song))
+
+def process_song(filename, output_dir, measures, compress, per_case, cache_dir, cache_size, profile, profile_memory, formats, merge_tracks, fold_chords, split_channels):
+    # runs in a warm worker. a malformed file is reported in the manifest instead of aborting the batch
+    entry = {
+        "filename":   filename,
+        "output_dir": output_dir,
+        "status":     "ok",
+        "error":      None,
+        "events":     {},
+        "cache":      {"hits": 0, "misses": 0},
+        "profile":    None,
+        "seconds":    0.0
+    }
+
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary = process_music.process_file(
+                filename,
+                output_dir     = output_dir,
+                measures       = measures,
+                compress       = compress,
+                per_case       = per_case,
+                cache_dir      = cache_dir,
+                cache_size     = cache_size,
+                profile        = profile,
+                profile_memory = profile_memory,
+                formats        = formats,
+                merge_tracks   = merge_tracks,
+                fold_chords    = fold_chords,
+                split_channels = split_channels
+            )
+        entry["events"]  = summary["events"]
+        entry["cache"]   = summary["cache"]
+        entry["profile"] = summary["profile"]
+    except (utils.ProcessMusicError, OSError, EOFError, ValueError, IndexError) as e:
+        # unreadable files and messages mido cannot decode, e.g. of a truncated track chunk. anything else is a bug
+        entry["status"] = "error"
+        entry["error"]  = f"{type(e).__name__}: {e}"
+
+    entry["seconds"] = time.perf_counter() - start
+    return entry
+
+def process_corpus(filenames, output_dir=None, measures=1, compress=False, per_case=False, jobs=1, cache_dir=None, cache_size=1024, profile=False, profile_memory=False, formats=constants.DEFAULT_FORMATS, merge_tracks=False, fold_chords=False, split_channels=False):
+    work = [(filename, get_song_output_dir(filename, output_dir), measures, compress, per_case, cache_dir, cache_size, profile, profile_memory, formats, merge_tracks, fold_chords, split_channels) for filename in filenames]
+
+    start   = time.perf_counter()
+    entries = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        for entry in executor.map(process_song, *zip(*work)):
+            status = "ok" if entry["status"] == "ok" else f"failed ({entry['error']})"
+            print(f"{entry['filename']}: {sum(entry['events'].values())} events in {entry['seconds']:.3f}s {status}")
+            entries.append(entry)
+
+    return {
+        "files":   len(entries),
+        "ok":      sum(1 for entry in entries if entry["status"] == "ok"),
+        "failed":  sum(1 for entry in entries if entry["status"] != "ok"),
+        "events":  sum(sum(entry["events"].values()) for entry in entries),
+        "cache": {
+            "hits":   sum(entry["cache"]["hits"] for entry in entries),
+            "misses": sum(entry["cache"]["misses"] for entry in entries)
+        },
+        "seconds": time.perf_counter() - start,
+        "profile": profiling.merge(entry["profile"] for entry in entries) if profile else None,
+        "songs":   entries
+    }
+
+def main(args):
+    output_dir = args["--output_dir"]
+    manifest   = args["--manifest"]
+
+    filenames = collect_midi_files(args["MIDI_FILES"])
+    if len(filenames) == 0:
+        print("No MIDI files found")
+        sys.exit(1)
+
+    summary = process_corpus(
+        filenames,
+        output_dir     = output_dir,
+        measures       = args["--measures"],
+        compress       = args["--gzip"],
+        per_case       = args["--per_case"],
+        jobs           = args["--jobs"],
+        cache_dir      = args["--cache_dir"],
+        cache_size     = args["--cache_size"],
+        profile        = args["--profile"] or args["--profile_memory"],
+        profile_memory = args["--profile_memory"],
+        formats        = args["--formats"],
+        merge_tracks   = args["--merge"],
+        fold_chords    = args["--chords"],
+        split_channels = args["--split_channels"])
+
+    if manifest is None:
+        manifest = os.path.join(output_dir or ".", "manifest.json")
+
+    if os.path.dirname(manifest) and not os.path.exists(os.path.dirname(manifest)):
+        os.makedirs(os.path.dirname(manifest))
+
+    with open(manifest, "w") as fh:
+        json.dump(summary, fh, indent=2)
+
+    if args["--cache_dir"] is not None:
+        print(f"Cache: {summary['cache']['hits']} hits, {summary['cache']['misses']} misses")
+
+    print(f"{summary['ok']} of {summary['files']} MIDI files processed in {summary['seconds']:.3f}s. Manifest written to '{manifest}'")
+
+if __name__ == '__main__':
+    args   = docopt(__doc__, version=constants.VERSION)
+    schema = Schema({
+        "MIDI_FILES": [str],
+        "--measures": And(Use(utils.parse_measures), lambda x: all(m >= 0 for m in x), error="Measures should be a comma separated list of positive numbers"),
+        "--output_dir": Or(None, str),
+        "--jobs": And(Use(int), lambda x: x >= 1, error="Jobs should be a positive non-zero number"),
+        "--manifest": Or(None, str),
+        "--gzip": bool,
+        "--per_case": bool,
+        "--cache_dir": Or(None, str),
+        "--cache_size": And(Use(int), lambda x: x > 0, error="Cache size should be a positive non-zero number"),
+        "--profile": bool,
+        "--profile_memory": bool,
+        "--formats": And(Use(utils.parse_formats), lambda x: len(x) > 0 and all(f in constants.FORMATS for f in x), error="Formats should be a comma separated list of csv, xes, footprint, npz and counts"),
+        "--merge": bool,
+        "--chords": bool,
+        "--split_channels": bool,
+        "--version": bool,
+        "--help": bool
+    })
+
+    try:
+        args = schema.validate(args)
+    except SchemaError as e:
+        print("Warning: invalid arguments given", e, "\n")
+        print(__doc__)
+        sys.exit(1)
+
+    main(args)
@@ -0,0 +1,144 @@
+import constants
+import store
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+ENTRY_FILE  = "entry.json"
+EVENTS_FILE = "events.npz"
+
+# the timestamps of csv and xes logs depend on the start date of the run, so they are not cached
+# but written again from the cached event table, whose times are relative to the start of the song
+TIMESTAMPED_FORMATS = [constants.FORMAT_CSV, constants.FORMAT_XES]
+
+def get_cached_formats(formats):
+    return [output_format for output_format in formats if output_format not in TIMESTAMPED_FORMATS]
+
+def get_artifacts(i, granularities, compress, formats=constants.DEFAULT_FORMATS):
+    # file names of all artifacts of a track, relative to the output directory. several granularities
+    # are stored in a sub directory each
+    artifacts = []
+    for measures in granularities:
+        directory = "" if len(granularities) == 1 else f"measures_{measures}/"
+        if constants.FORMAT_CSV in formats:
+            artifacts.append(f"{directory}track_{i}.csv")
+        if constants.FORMAT_XES in formats:
+            artifacts.append(f"{directory}track_{i}.xes.gz" if compress else f"{directory}track_{i}.xes")
+        if constants.FORMAT_FOOTPRINT in formats:
+            artifacts.append(f"{directory}track_{i}_footprint_matrix.txt")
+        if constants.FORMAT_NPZ in formats:
+            artifacts.append(f"{directory}track_{i}.npz")
+        if constants.FORMAT_COUNTS in formats:
+            artifacts.append(f"{directory}track_{i}_counts.npz")
+
+    return artifacts
+
+def get_track_key(raw, meta, granularities, compress, per_case, formats=constants.DEFAULT_FORMATS, fold_chords=False):
+    # hash the raw bytes of the track chunk and every parameter affecting the output of the track
+    digest = hashlib.sha256()
+    digest.update(json.dumps([
+        constants.VERSION,
+        granularities,
+        meta["ticks_per_beat"],
+        meta["bar_index"].get_key() if meta["bar_index"] is not None else None,
+        meta["tempo_map"].get_key() if meta["tempo_map"] is not None else None,
+        compress,
+        per_case,
+        sorted(formats),
+        fold_chords
+    ]).encode())
+
+    digest.update(raw)
+
+    return digest.hexdigest()
+
+class ResultCache:
+    # content-addressed store of track artifacts. every entry is a directory named by the track key,
+    # its modification time marks the last use for the LRU eviction
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size  = max_size
+
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+    def get_entry_dir(self, key):
+        return os.path.join(self.directory, key)
+
+    def restore(self, key, output_dir, i, granularities, compress, formats=constants.DEFAULT_FORMATS):
+        # returns the number of events and the event table the timestamped logs are written from, None on a miss
+        entry_dir = self.get_entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, ENTRY_FILE)) as fh:
+                entry = json.load(fh)
+
+            for name, artifact in zip(entry["artifacts"], get_artifacts(i, granularities, compress, get_cached_formats(formats))):
+                shutil.copyfile(os.path.join(entry_dir, name), os.path.join(output_dir, artifact))
+
+            table = None
+            if entry["table"]:
+                table = store.EventTable.load(os.path.join(entry_dir, EVENTS_FILE))
+
+            os.utime(entry_dir)
+        except (OSError, ValueError, KeyError):
+            return None
+
+        return entry["events"], table
+
+    def store(self, key, output_dir, i, granularities, compress, events, formats=constants.DEFAULT_FORMATS, table=None):
+        # table is the event table of the first granularity, needed if any of the formats is timestamped or for the song logs
+        artifacts = get_artifacts(i, granularities, compress, get_cached_formats(formats))
+        names     = [artifact.replace(f"track_{i}", "track", 1).replace("/", "_") for artifact in artifacts]
+
+        # fill a temporary directory first and rename it, so concurrent workers never see half-written entries
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=self.directory)
+        for name, artifact in zip(names, artifacts):
+            shutil.copyfile(os.path.join(output_dir, artifact), os.path.join(staging, name))
+
+        if table is not None:
+            table.save(os.path.join(staging, EVENTS_FILE))
+
+        with open(os.path.join(staging, ENTRY_FILE), "w") as fh:
+            json.dump({"artifacts": names, "events": events, "table": table is not None, "created": time.time()}, fh)
+
+        # an entry stored without its event table is replaced by one with it
+        if table is not None:
+            shutil.rmtree(self.get_entry_dir(key), ignore_errors=True)
+
+        try:
+            os.rename(staging, self.get_entry_dir(key))
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        self.evict()
+
+    def get_entries(self):
+        entries = []
+        for key in os.listdir(self.directory):
+            entry_dir = self.get_entry_dir(key)
+            if key.startswith(".") or not os.path.isdir(entry_dir):
+                continue
+
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(entry_dir))
+                entries.append((os.stat(entry_dir).st_mtime, size, entry_dir))
+            except OSError:
+                continue
+
+        return entries
+
+    def evict(self):
+        # drop the least recently used entries until the cache fits into its size limit
+        entries = sorted(self.get_entries())
+        size    = sum(entry[1] for entry in entries)
+
+        for _, entry_size, entry_dir in entries:
+            if size <= self.max_size:
+                break
+
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            size = size - entry_size
@@ -0,0 +1,129 @@
+import constants
+import processor
+import profiling
+import utils
+
+# chord templates as intervals from the root, in the order of their chord tones (root, third, fifth, ...).
+# a pitch class set matching several templates gets the name of the first one, e.g. C E G A is Am7 and not C6
+TEMPLATES = [
+    ("",      [0, 4, 7]),
+    ("m",     [0, 3, 7]),
+    ("dim",   [0, 3, 6]),
+    ("aug",   [0, 4, 8]),
+    ("sus4",  [0, 5, 7]),
+    ("sus2",  [0, 2, 7]),
+    ("7",     [0, 4, 7, 10]),
+    ("maj7",  [0, 4, 7, 11]),
+    ("m7",    [0, 3, 7, 10]),
+    ("mMaj7", [0, 3, 7, 11]),
+    ("m7b5",  [0, 3, 6, 10]),
+    ("dim7",  [0, 3, 6, 9]),
+    ("aug7",  [0, 4, 8, 10]),
+    ("6",     [0, 4, 7, 9]),
+    ("m6",    [0, 3, 7, 9]),
+    ("7sus4", [0, 5, 7, 10]),
+    ("7",     [0, 4, 10]),
+    ("maj7",  [0, 4, 11]),
+    ("m7",    [0, 3, 10]),
+    ("add9",  [0, 4, 7, 2]),
+    ("madd9", [0, 3, 7, 2]),
+    ("9",     [0, 4, 7, 10, 2]),
+    ("maj9",  [0, 4, 7, 11, 2]),
+    ("m9",    [0, 3, 7, 10, 2]),
+    ("(5)",   [0, 7]),
+    ("(m2)",  [0, 1]),
+    ("(M2)",  [0, 2]),
+    ("(m3)",  [0, 3]),
+    ("(M3)",  [0, 4]),
+    ("(tt)",  [0, 6]),
+    ("(8)",   [0])
+]
+
+def get_mask(pitches):
+    mask = 0
+    for pitch in pitches:
+        mask = mask | (1 << pitch)
+    return mask
+
+def create_tables():
+    # name, root and inversion by bass pitch class of all 4096 pitch class sets. sets without a template
+    # are named by their pitch classes and get their lowest pitch class as root
+    names      = [None] * 4096
+    roots      = [-1] * 4096
+    inversions = [[-1] * 12 for _ in range(4096)]
+    for suffix, intervals in TEMPLATES:
+        for root in range(12):
+            tones = [(root + interval) % 12 for interval in intervals]
+            mask  = get_mask(tones)
+            if names[mask] is not None:
+                continue
+
+            names[mask] = f"{constants.PITCHES[root]}{suffix}"
+            roots[mask] = root
+            for inversion, tone in enumerate(tones):
+                inversions[mask][tone] = inversion
+
+    for mask in range(1, 4096):
+        if names[mask] is None:
+            pitches     = [pitch for pitch in range(12) if mask & (1 << pitch)]
+            names[mask] = "-".join(constants.PITCHES[pitch] for pitch in pitches)
+            roots[mask] = pitches[0]
+
+    return names, roots, inversions
+
+NAMES, ROOTS, INVERSIONS = create_tables()
+
+# the root pitch class of every chord name, with or without bass note
+NAME_ROOTS = {name: root for name, root in zip(NAMES, ROOTS) if name is not None}
+NOTES      = {key: note for note, key in enumerate(utils.KEYS)}
+
+def label_chord(notes):
+    # name and inversion of the MIDI notes of a chord, inverted chords are named with their bass, e.g. C/E
+    mask = 0
+    for note in notes:
+        mask = mask | (1 << (note % 12))
+
+    bass      = min(notes) % 12
+    inversion = max(INVERSIONS[mask][bass], 0)
+    if inversion > 0:
+        return f"{NAMES[mask]}/{constants.PITCHES[bass]}", inversion
+
+    return NAMES[mask], inversion
+
+def get_root(label):
+    # the root pitch class of a chord label, -1 for anything else
+    return NAME_ROOTS.get(label.split("/")[0], -1)
+
+def fold_chords(events):
+    # merge the events of the notes of a chord, i.e. events in a row sharing their order, into one event
+    # named after the chord. it takes over the note type, time and bar of the first note
+    chord = []
+    for event in events:
+        if len(chord) > 0 and (not event.is_chord or event.order != chord[0].order):
+            yield create_chord_event(chord)
+            chord = []
+
+        if event.is_chord and event.key in NOTES:
+            chord.append(event)
+        else:
+            yield event
+
+    if len(chord) > 0:
+        yield create_chord_event(chord)
+
+def create_chord_event(chord):
+    if len(chord) == 1:
+        return chord[0]
+
+    label, _ = label_chord([NOTES[event.key] for event in chord])
+    profiling.count("folded_chord_notes", len(chord))
+
+    return processor.Event(
+        case     = chord[0].case,
+        key      = label,
+        type     = chord[0].type,
+        order    = chord[0].order,
+        is_chord = True,
+        time     = chord[0].time,
+        bar      = chord[0].bar
+    )
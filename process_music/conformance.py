@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+"""Process Music conformance. Replay track logs against the directly-follows relations of a reference footprint
+
+Usage:
+    conformance.py [--jobs JOBS] [--per_case] [--limit LIMIT] [--output OUTPUT] REFERENCE LOGS...
+    conformance.py (-h | --help)
+    conformance.py (-v | --version)
+
+Options:
+    -h --help               Show help.
+    -v --version            Show version information.
+    --jobs JOBS             The number of processes the logs are replayed with [default: 1].
+    --per_case              Consider only transitions within a case, like the footprint matrix written with --per_case.
+    --limit LIMIT           The number of offending transitions reported per log [default: 5].
+    --output OUTPUT         Additionally write the fitness of every case of every log to this CSV file.
+
+REFERENCE is a footprint matrix (*_footprint_matrix.txt), a count file (*_counts.npz) or a track log (.npz or .csv)
+the footprint is calculated of. LOGS can be track logs (.npz or .csv), directories searched recursively for the
+track and channel logs in them or glob patterns. The fitness of a log or case is the share of its transitions which
+are allowed by the reference, i.e. which are marked => or || in the reference footprint matrix.
+
+Copyright:
+    (c) by K-u-K (imperial Keller Patrick & royal Kocaj Alen) 2020
+"""
+from docopt import docopt
+from schema import Schema, And, Use, Or, SchemaError
+
+import numpy as np
+
+import constants
+import footprint
+import utils
+
+import concurrent.futures
+import glob
+import os
+import sys
+import time
+
+LOG_PREFIXES   = ["track_", "channel_"]
+LOG_EXTENSIONS = [".npz", ".csv"]
+
+def load_footprint_matrix(filename):
+    # the allowed directly-follows relations of a footprint matrix written by footprint.calculate_footprint_symbols
+    size    = len(footprint.PITCHES)
+    allowed = np.zeros((size, size), dtype=np.bool_)
+    with open(filename) as fh:
+        labels = fh.readline().split()
+        if any(label not in footprint.PITCH_CODES for label in labels):
+            raise utils.ProcessMusicError(f"'{filename}' is no footprint matrix of pitches")
+
+        codes = [footprint.PITCH_CODES[label] for label in labels]
+        for line in fh:
+            values = line.split()
+            if len(values) == 0:
+                continue
+
+            if values[0] not in footprint.PITCH_CODES or len(values) != len(codes) + 1:
+                raise utils.ProcessMusicError(f"'{filename}' is no footprint matrix of pitches")
+
+            row = footprint.PITCH_CODES[values[0]]
+            for code, symbol in zip(codes, values[1:]):
+                allowed[row, code] = symbol in ("=>", "||")
+
+    return allowed
+
+def load_reference(filename, per_case=False):
+    # the reference as boolean matrix, allowed[a, b] tells whether pitch code a may be directly followed by b
+    if filename.endswith(".txt"):
+        return load_footprint_matrix(filename)
+
+    if filename.endswith("_counts.npz"):
+        return footprint.load_counts(filename)["pitches"] > 0
+
+    if filename.endswith(".npz") or filename.endswith(".csv"):
+        return footprint.calculate_transition_counts(filename, per_case) > 0
+
+    raise utils.ProcessMusicError(f"'{filename}' is neither a footprint matrix, count file nor track log")
+
+def collect_logs(sources):
+    # track logs written as both event table and CSV are replayed once from the event table
+    filenames = []
+    for source in sources:
+        if os.path.isdir(source):
+            candidates = sorted(glob.glob(os.path.join(source, "**", "*"), recursive=True))
+            candidates = [candidate for candidate in candidates if any(os.path.basename(candidate).startswith(prefix) for prefix in LOG_PREFIXES)]
+        else:
+            candidates = sorted(glob.glob(source))
+
+        for candidate in candidates:
+            base, extension = os.path.splitext(candidate)
+            if extension not in LOG_EXTENSIONS or base.endswith("_counts") or candidate in filenames:
+                continue
+            if extension == ".csv" and os.path.exists(f"{base}.npz"):
+                continue
+            filenames.append(candidate)
+
+    return filenames
+
+def replay(filename, allowed, per_case=False, limit=5):
+    # replay all transitions of a log at once: the fitting ones are looked up in the reference,
+    # cases and offending transitions are counted with bincount
+    codes, cases       = footprint.encode_events(filename)
+    prev, curr, owners = footprint.get_transitions(codes, cases, per_case)
+    fits               = allowed[prev, curr]
+
+    case_ids, index = np.unique(owners, return_inverse=True)
+    transitions     = np.bincount(index, minlength=len(case_ids))
+    fitting         = np.bincount(index, weights=fits, minlength=len(case_ids)).astype(np.int64)
+
+    size       = len(footprint.PITCHES)
+    offending  = np.bincount(prev[~fits] * size + curr[~fits], minlength=size * size)
+    worst      = np.argsort(-offending, kind="stable")[:limit]
+    violations = [(footprint.PITCHES[code // size], footprint.PITCHES[code % size], int(offending[code])) for code in worst if offending[code] > 0]
+
+    return {
+        "filename":    filename,
+        "events":      len(codes),
+        "transitions": len(fits),
+        "fitting":     int(fits.sum()),
+        "cases":       [(int(case), int(total), int(fit)) for case, total, fit in zip(case_ids, transitions, fitting)],
+        "violations":  violations
+    }
+
+def replay_logs(filenames, allowed, per_case=False, limit=5):
+    results = []
+    for filename in filenames:
+        try:
+            results.append(replay(filename, allowed, per_case, limit))
+        except (OSError, ValueError, KeyError) as e:
+            results.append({"filename": filename, "error": str(e)})
+
+    return results
+
+def check_conformance(filenames, allowed, per_case=False, limit=5, jobs=1):
+    # every worker replays one shard of the logs, the results keep the order of the filenames
+    if jobs == 1 or len(filenames) < 2:
+        return replay_logs(filenames, allowed, per_case, limit)
+
+    jobs   = min(jobs, len(filenames))
+    shards = [filenames[i::jobs] for i in range(jobs)]
+
+    results = [None] * len(filenames)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(replay_logs, shard, allowed, per_case, limit) for shard in shards]
+        for i, future in enumerate(futures):
+            results[i::jobs] = future.result()
+
+    return results
+
+def get_fitness(fitting, transitions):
+    # a log without any transition has nothing not to fit
+    return fitting / transitions if transitions > 0 else 1.0
+
+def write_cases(results, output):
+    with open(output, "w") as fh:
+        fh.write("Log;Case_ID;Transitions;Fitting;Fitness\n")
+        for result in results:
+            for case, transitions, fitting in result.get("cases", []):
+                fh.write(f"{result['filename']};{case};{transitions};{fitting};{get_fitness(fitting, transitions):.4f}\n")
+
+def main(args):
+    try:
+        allowed = load_reference(args["REFERENCE"], args["--per_case"])
+    except (utils.ProcessMusicError, OSError, ValueError, KeyError) as e:
+        print(e)
+        sys.exit(1)
+
+    filenames = collect_logs(args["LOGS"])
+    if len(filenames) == 0:
+        print("No track logs found")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    results = check_conformance(filenames, allowed, args["--per_case"], args["--limit"], args["--jobs"])
+    elapsed = time.perf_counter() - started
+
+    transitions = 0
+    fitting     = 0
+    for result in results:
+        if "error" in result:
+            print(f"{result['filename']}: failed, {result['error']}")
+            continue
+
+        transitions = transitions + result["transitions"]
+        fitting     = fitting + result["fitting"]
+        cases       = sum(1 for _, total, fit in result["cases"] if fit < total)
+        violations  = ", ".join(f"{prev} -> {curr} ({count})" for prev, curr, count in result["violations"])
+
+        print(f"{result['filename']}: fitness {get_fitness(result['fitting'], result['transitions']):.4f}, "
+              f"{result['transitions'] - result['fitting']} of {result['transitions']} transitions and {cases} of {len(result['cases'])} cases not fitting"
+              + (f": {violations}" if len(violations) > 0 else ""))
+
+    if args["--output"] is not None:
+        write_cases(results, args["--output"])
+
+    print(f"{len(results)} logs replayed in {elapsed:.2f}s, fitness {get_fitness(fitting, transitions):.4f} over {transitions} transitions")
+
+if __name__ == '__main__':
+    args   = docopt(__doc__, version=constants.VERSION)
+    schema = Schema({
+        "REFERENCE": And(os.path.exists, error="REFERENCE should exist"),
+        "LOGS": [str],
+        "--jobs": And(Use(int), lambda x: x >= 1, error="Jobs should be a positive non-zero number"),
+        "--per_case": bool,
+        "--limit": And(Use(int), lambda x: x >= 0, error="Limit should be a positive number"),
+        "--output": Or(None, str),
+        "--version": bool,
+        "--help": bool
+    })
+
+    try:
+        args = schema.validate(args)
+    except SchemaError as e:
+        print("Warning: invalid arguments given", e, "\n")
+        print(__doc__)
+        sys.exit(1)
+
+    main(args)
@@ -1,5 +1,19 @@
 import numpy as np
 
+from collections import namedtuple
+
+VERSION = "0.2.0"
+
+# the outputs written for each track
+FORMAT_CSV       = "csv"
+FORMAT_XES       = "xes"
+FORMAT_FOOTPRINT = "footprint"
+FORMAT_NPZ       = "npz"
+FORMAT_COUNTS    = "counts"
+
+FORMATS         = [FORMAT_CSV, FORMAT_XES, FORMAT_FOOTPRINT, FORMAT_NPZ, FORMAT_COUNTS]
+DEFAULT_FORMATS = [FORMAT_CSV, FORMAT_XES, FORMAT_FOOTPRINT]
+
 UNKNOWN_NOTE_TYPE = "unknown"
 
 NOTE_WHOLE                            = "whole note"
@@ -39,6 +53,8 @@ PITCH_A_SHARP   = "A#"
 PITCH_B_FLAT    = "Bb"
 PITCH_B         = "B"
 
+PAUSE = "Pause"
+
 PITCHES = [
     PITCH_C,
     PITCH_C_SHARP,
@@ -63,6 +79,7 @@ NOTE_EVENTS = [
 ]
 
 META_SET_TEMPO      = "set_tempo"
+DEFAULT_TEMPO       = 500000
 META_TIME_SIGNATUR  = "time_signature"
 
 def calculate_ratios(base_ratio, deviation, notes):
@@ -85,6 +102,30 @@ def calculate_ratios(base_ratio, deviation, notes):
 
     return note_types
 
+def calculate_lookup(note_types):
+    names  = [*note_types.keys()]
+    bounds = np.array([*note_types.values()])
+    lower  = bounds[:, 0]
+    upper  = bounds[:, 1]
+
+    # split the ratio axis at every bound into elementary segments (edges[j-1], edges[j]]
+    # and label each segment with the first note type (in definition order) covering it
+    edges    = np.unique(bounds)
+    covering = (lower[:, None] <= edges[:-1]) & (edges[1:] <= upper[:, None])
+    labels   = np.where(covering.any(axis=0), np.argmax(covering, axis=0), -1)
+
+    # pad the labels so np.searchsorted(edges, ratio) can be used as index directly
+    labels = np.concatenate(([-1], labels, [-1]))
+
+    return NoteTypeLookup(
+        names   = names,
+        lower   = lower,
+        upper   = upper,
+        middles = (lower + upper) / 2,
+        edges   = edges,
+        labels  = labels,
+        plain   = np.array(["dotted" not in name for name in names]))
+
 def calculate_signature_denominators(base_ratio, notes):
     return {(base_ratio / (base_ratio * 0.5 ** i)): note for i, note in enumerate(notes)}
 
@@ -98,6 +139,17 @@ NOTE_TYPES       = calculate_ratios(BASE_RATIO, DEVIATION, NOTES)
 NOTE_LOWER_BOUND = np.min(list(NOTE_TYPES.values()))
 NOTE_UPPER_BOUND = np.max(list(NOTE_TYPES.values()))
 
+# pauses are never dotted whole notes
+NOTE_TYPES_PAUSE = {key: bound for key, bound in NOTE_TYPES.items() if key not in [
+    f"double dotted {NOTE_WHOLE}",
+    f"dotted {NOTE_WHOLE}"
+]}
+
+# sorted bound arrays for classifying whole batches of durations at once
+NoteTypeLookup          = namedtuple("NoteTypeLookup", ["names", "lower", "upper", "middles", "edges", "labels", "plain"])
+NOTE_TYPES_LOOKUP       = calculate_lookup(NOTE_TYPES)
+NOTE_TYPES_PAUSE_LOOKUP = calculate_lookup(NOTE_TYPES_PAUSE)
+
 # calculate time signature lookup
 SIGNATURE_UNIT = calculate_signature_denominators(BASE_RATIO, NOTES)
 
@@ -1,68 +1,174 @@
-from pm4py.objects.log.adapters.pandas import csv_import_adapter
-
 import numpy as np
-import pandas as pd
 
-import os
-import sys
+import csv
 
+import chords
 import constants
-
-def calculate_footprint_symbol(ft, prevnext, curr, arrow1, arrow2):
-    if prevnext is None:
-        return ft
-
-    if (ft[prevnext][curr] == '#'): 
-        ft[prevnext][curr] = arrow1
-
-    if (ft[prevnext][curr] == arrow2): 
-        ft[prevnext][curr] = '||'
-
-    return ft
-
-def calculate_footprint_matrix(filename):
-    output = os.path.splitext(filename)[0].lower()
-
-    df = csv_import_adapter.import_dataframe_from_path(filename, sep=";")
-
-    pitches          = constants.PITCHES + ["Pause"]
-    pitches_range    = np.arange(len(pitches))
-    footprint_matrix = pd.DataFrame('#', index=pitches_range, columns=pitches_range)
-
-    rename_dict = {i:pitch for i, pitch in enumerate(pitches)}
-    footprint_matrix.rename(
-        index=rename_dict, 
-        columns=rename_dict, 
-        inplace=True)
-
-    # Consider transitions only within a case
-    # d = {}
-    # for index, row in df.iterrows():
-    #     if row['Case_ID'] not in d.keys():
-    #         d[row['Case_ID']] = []
-    #     d[row['Case_ID']].append(row['Event'])
-
-    # Consider transitions beyond a case
-    d = {"0": []}
-    for _, row in df.iterrows():
-        d["0"].append(row["Event"])
-
-    for _, value in d.items():
-        for prev, curr, next in zip([None]+value[:-1], value, value[1:]+[None]):
-            if curr is None:
-                continue
-            
-            if curr is not None and curr[:-1] in constants.PITCHES:
-                curr = curr[:-1]
-            if prev is not None and prev[:-1] in constants.PITCHES:
-                prev = prev[:-1]
-            if next is not None and next[:-1] in constants.PITCHES:
-                next = next[:-1]
-
-            if prev is not None:
-                footprint_matrix = calculate_footprint_symbol(footprint_matrix, prev, curr, '<=', '=>')
-
-            if next is not None:
-                footprint_matrix = calculate_footprint_symbol(footprint_matrix, next, curr, '=>', '<=')
-
-    return footprint_matrix
+import store
+
+# pitch classes without octave plus pauses, encoded as small integers
+PITCHES     = constants.PITCHES + [constants.PAUSE]
+PITCH_CODES = {pitch: code for code, pitch in enumerate(PITCHES)}
+
+def encode_pitch(key):
+    # strip the octave of a note name, e.g. C#4 -> C# or C-1 -> C. chords are encoded by their root,
+    # unknown events as -1
+    code = PITCH_CODES.get(key.rstrip("-0123456789"))
+    return chords.get_root(key) if code is None else code
+
+def _read_events(filename):
+    keys  = []
+    cases = []
+    with open(filename, newline="") as fh:
+        for row in csv.DictReader(fh, delimiter=";"):
+            keys.append(row["Event"])
+            cases.append(int(row["Case_ID"]))
+
+    return keys, cases
+
+def encode_events(source, cases=None):
+    # source is either the path of a track CSV or event table (.npz), an event table,
+    # a sequence of events or an array of pitch codes
+    if isinstance(source, str) and source.endswith(".npz"):
+        codes, cases = store.load_pitches(source)
+    elif isinstance(source, store.EventTable):
+        codes = source.get_pitches()
+        cases = source.case
+    elif isinstance(source, str):
+        keys, cases = _read_events(source)
+        codes       = [encode_pitch(key) for key in keys]
+    elif isinstance(source, np.ndarray):
+        codes = source
+    else:
+        codes = [encode_pitch(event.key) for event in source]
+        cases = [event.case for event in source]
+
+    codes = np.asarray(codes, dtype=np.int8)
+    cases = np.zeros(len(codes), dtype=np.int64) if cases is None else np.asarray(cases, dtype=np.int64)
+
+    return codes, cases
+
+def get_transitions(codes, cases, per_case=False):
+    # the codes of all pairs of directly following events and the case of the second one
+    if per_case:
+        # consider transitions only within a case
+        order = np.argsort(cases, kind="stable")
+        codes = codes[order]
+        cases = cases[order]
+
+    prev  = codes[:-1].astype(np.int64)
+    curr  = codes[1:].astype(np.int64)
+    valid = (prev >= 0) & (curr >= 0)
+    if per_case:
+        valid = valid & (cases[:-1] == cases[1:])
+
+    return prev[valid], curr[valid], cases[1:][valid]
+
+def count_transitions(codes, cases, size, per_case=False):
+    prev, curr, _ = get_transitions(codes, cases, per_case)
+
+    # counts[a, b] is the number of times code a is directly followed by code b
+    counts = np.bincount(prev * size + curr, minlength=size * size)
+
+    return counts.reshape(size, size)
+
+def calculate_transition_counts(source, per_case=False, cases=None):
+    codes, cases = encode_events(source, cases)
+    return count_transitions(codes, cases, len(PITCHES), per_case)
+
+def calculate_type_counts(table, per_case=False):
+    # directly-follows counts of the note types of an event table, labelled by table.types
+    return count_transitions(table.type, table.case, len(table.types), per_case)
+
+def create_counts(table, per_case=False):
+    # the partial of a track: its pitch and note type counts, which add up to the counts of a whole corpus
+    return {
+        "pitches":    calculate_transition_counts(table, per_case),
+        "types":      calculate_type_counts(table, per_case),
+        "type_names": [*table.types],
+        "events":     len(table),
+        "tracks":     1
+    }
+
+def save_counts(counts, filename):
+    np.savez(
+        filename,
+        pitches    = counts["pitches"],
+        types      = counts["types"],
+        type_names = np.array(counts["type_names"], dtype=str),
+        events     = counts["events"],
+        tracks     = counts["tracks"])
+
+def load_counts(filename):
+    with np.load(filename, allow_pickle=False) as data:
+        return {
+            "pitches":    data["pitches"],
+            "types":      data["types"],
+            "type_names": data["type_names"].tolist(),
+            "events":     int(data["events"]),
+            "tracks":     int(data["tracks"])
+        }
+
+def add_counts(total, counts):
+    # sum two partials. note types are matched by name, types missing in total are appended
+    if total is None:
+        return counts
+
+    type_names = total["type_names"] + [name for name in counts["type_names"] if name not in total["type_names"]]
+    index      = [type_names.index(name) for name in counts["type_names"]]
+
+    types = np.zeros((len(type_names), len(type_names)), dtype=np.int64)
+    types[:len(total["type_names"]), :len(total["type_names"])] = total["types"]
+    types[np.ix_(index, index)] += counts["types"]
+
+    return {
+        "pitches":    total["pitches"] + counts["pitches"],
+        "types":      types,
+        "type_names": type_names,
+        "events":     total["events"] + counts["events"],
+        "tracks":     total["tracks"] + counts["tracks"]
+    }
+
+class TransitionCounter:
+    # directly-follows counts built up event by event. events of different streams, e.g. the tracks
+    # of a merged song log, only follow events of their own stream. with per_case an event follows the
+    # previous one of its case, like the cases grouped by count_transitions
+    def __init__(self, per_case=False):
+        size          = len(PITCHES)
+        self.counts   = np.zeros((size, size), dtype=np.int64)
+        self.per_case = per_case
+        self.prev     = {}
+
+    def add(self, key, case, stream=None):
+        code = encode_pitch(key)
+        last = (stream, case) if self.per_case else stream
+        prev = self.prev.get(last)
+        if prev is not None and prev >= 0 and code >= 0:
+            self.counts[prev, code] += 1
+
+        self.prev[last] = code
+
+    def close_case(self, case):
+        # no event follows the events of a complete case anymore, e.g. in a stream which never ends
+        if self.per_case:
+            self.prev = {last: code for last, code in self.prev.items() if last[1] != case}
+
+def calculate_footprint_symbols(counts, labels=PITCHES):
+    # pandas is only needed for the symbol matrix and slow to import, so it is imported on first use
+    import pandas as pd
+
+    follows = counts > 0
+    symbols = np.full(counts.shape, "#", dtype=object)
+
+    symbols[follows]             = "=>"
+    symbols[follows.T]           = "<="
+    symbols[follows & follows.T] = "||"
+
+    return pd.DataFrame(symbols, index=labels, columns=labels)
+
+def calculate_footprint(source, per_case=False, cases=None):
+    counts = calculate_transition_counts(source, per_case, cases)
+    return counts, calculate_footprint_symbols(counts)
+
+def calculate_footprint_matrix(source, per_case=False, cases=None):
+    return calculate_footprint(source, per_case, cases)[1]
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+
+"""Process Music interval index. Find the notes of all tracks sounding at a tick or within a case
+
+Usage:
+    intervals.py sounding [--tracks TRACKS...] MIDI_FILE TICK
+    intervals.py case [--measures MEASURES] [--tracks TRACKS...] MIDI_FILE CASE
+    intervals.py (-h | --help)
+    intervals.py (-v | --version)
+
+Options:
+    -h --help               Show help.
+    -v --version            Show version information.
+    --measures MEASURES     The number of measures you want to define for a case. Zero defines everything as trace / case [default: 1].
+    --tracks TRACKS....     Which tracks to consider. Multiple values possible. A negative value of -1 takes all [default: -1]
+
+Copyright:
+    (c) by K-u-K (imperial Keller Patrick & royal Kocaj Alen) 2020
+"""
+from docopt import docopt
+from schema import Schema, And, Use, Or, SchemaError
+
+import numpy as np
+
+import chords
+import constants
+import merge
+import midi
+import processor
+import profiling
+import timing
+import utils
+
+import os
+import sys
+
+SONORITY_LOG = "sonority_log"
+
+# the sonority events of all tracks together are written as track -1
+SONORITY_TRACK      = -1
+SONORITY_INSTRUMENT = "Sonority"
+
+def read_track_intervals(messages):
+    # [start, end) in ticks and note of every note of a track. a note struck again before its note_off is
+    # ended by the next note_off of its pitch first, notes without note_off are dropped
+    starts  = []
+    ends    = []
+    notes   = []
+    tick    = 0
+    pending = [[] for _ in range(128)]
+    for msg in messages:
+        tick = tick + msg.time
+        if msg.type not in constants.NOTE_EVENTS:
+            continue
+
+        if msg.type == constants.NOTE_ON and msg.velocity != 0:
+            pending[msg.note].append(tick)
+        elif len(pending[msg.note]) > 0:
+            starts.append(pending[msg.note].pop(0))
+            ends.append(tick)
+            notes.append(msg.note)
+
+    return np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64), np.array(notes, dtype=np.int64)
+
+def join_note_intervals(track_intervals):
+    # the intervals of several tracks, given by track, as starts, ends, notes and the track of every note
+    empty  = np.zeros(0, dtype=np.int64)
+    starts = np.concatenate([empty] + [starts for starts, _, _ in track_intervals.values()])
+    ends   = np.concatenate([empty] + [ends for _, ends, _ in track_intervals.values()])
+    notes  = np.concatenate([empty] + [notes for _, _, notes in track_intervals.values()])
+    owners = np.concatenate([empty] + [np.full(len(starts), i, dtype=np.int64) for i, (starts, _, _) in track_intervals.items()])
+    return starts, ends, notes, owners
+
+def read_note_intervals(reader, tracks):
+    return join_note_intervals({i: read_track_intervals(reader.tracks[i]) for i in tracks})
+
+class IntervalIndex:
+    # centered interval tree over the notes of a song. every node keeps the notes sounding at its center sorted
+    # by start and by descending end, notes ending before the center are left of it, notes starting after it right.
+    # queries visit one path of the tree plus the nodes reporting notes, i.e. O(log n + k)
+    def __init__(self, starts, ends, notes, tracks):
+        # notes without length never sound
+        valid       = np.asarray(ends) > np.asarray(starts)
+        self.starts = np.asarray(starts, dtype=np.int64)[valid]
+        self.ends   = np.asarray(ends, dtype=np.int64)[valid]
+        self.notes  = np.asarray(notes, dtype=np.int64)[valid]
+        self.tracks = np.asarray(tracks, dtype=np.int64)[valid]
+
+        self.nodes = []
+        self.root  = self.build(np.arange(len(self.starts)))
+
+    @classmethod
+    def from_reader(cls, reader, tracks):
+        return cls(*read_note_intervals(reader, tracks))
+
+    @classmethod
+    def from_tracks(cls, track_intervals):
+        # the intervals of tracks already read with read_track_intervals, given by track
+        return cls(*join_note_intervals(track_intervals))
+
+    def build(self, index):
+        if len(index) == 0:
+            return None
+
+        # the median start is the start of a note sounding at the center, so every node holds at least one note
+        starts = self.starts[index]
+        ends   = self.ends[index]
+        center = int(np.partition(starts, len(starts) // 2)[len(starts) // 2])
+
+        here     = index[(starts <= center) & (ends > center)]
+        by_start = here[np.argsort(self.starts[here], kind="stable")]
+        by_end   = here[np.argsort(-self.ends[here], kind="stable")]
+
+        left  = self.build(index[ends <= center])
+        right = self.build(index[starts > center])
+
+        self.nodes.append((center, left, right, by_start.tolist(), self.starts[by_start].tolist(), by_end.tolist(), self.ends[by_end].tolist()))
+        return len(self.nodes) - 1
+
+    def stab(self, tick):
+        # indices of all notes sounding at the given tick
+        found = []
+        node  = self.root
+        while node is not None:
+            center, left, right, by_start, start_values, by_end, end_values = self.nodes[node]
+            if tick < center:
+                for i, start in zip(by_start, start_values):
+                    if start > tick:
+                        break
+                    found.append(i)
+                node = left
+            elif tick > center:
+                for i, end in zip(by_end, end_values):
+                    if end <= tick:
+                        break
+                    found.append(i)
+                node = right
+            else:
+                found.extend(by_start)
+                node = None
+
+        return np.array(sorted(found), dtype=np.int64)
+
+    def overlap(self, start, end):
+        # indices of all notes sounding somewhere within [start, end)
+        found = []
+        nodes = [self.root]
+        while len(nodes) > 0:
+            node = nodes.pop()
+            if node is None:
+                continue
+
+            center, left, right, by_start, start_values, by_end, end_values = self.nodes[node]
+            if end <= center:
+                for i, value in zip(by_start, start_values):
+                    if value >= end:
+                        break
+                    found.append(i)
+                nodes.append(left)
+            elif start > center:
+                for i, value in zip(by_end, end_values):
+                    if value <= start:
+                        break
+                    found.append(i)
+                nodes.append(right)
+            else:
+                found.extend(by_start)
+                nodes.append(left)
+                nodes.append(right)
+
+        return np.array(sorted(found), dtype=np.int64)
+
+    def get_boundaries(self, min_length=1):
+        # every tick a note starts or ends at, from the start of the song on. boundaries closer than min_length
+        # to the previous one are dropped, e.g. the gap of a tick many files leave between two notes
+        boundaries = np.unique(np.concatenate(([0], self.starts, self.ends))).tolist()
+        kept       = boundaries[:1]
+        for boundary in boundaries[1:-1]:
+            if boundary - kept[-1] >= min_length:
+                kept.append(boundary)
+
+        if len(boundaries) > 1:
+            kept.append(boundaries[-1])
+
+        return np.array(kept, dtype=np.int64)
+
+def get_label(notes):
+    # the note name of a single note, the chord name of several ones
+    notes = sorted(set(notes))
+    if len(notes) == 1:
+        return utils.KEYS[notes[0]]
+
+    return chords.label_chord(notes)[0]
+
+def get_slice_types(lengths, ticks_per_beat):
+    # slices are cut by the notes of all tracks, so lengths no note type fits are expected and marked unknown
+    try:
+        return utils.get_note_types(lengths, ticks_per_beat)
+    except utils.ProcessMusicError:
+        pass
+
+    note_types = []
+    for length in lengths:
+        try:
+            note_types.append(utils.get_note_type(length, ticks_per_beat))
+        except utils.ProcessMusicError:
+            note_types.append((1, constants.UNKNOWN_NOTE_TYPE))
+
+    return note_types
+
+def iter_sonorities(index, tracks, ticks_per_beat, tempo_map, bar_index):
+    # slice the song at every note boundary. each slice gets an event per track with its notes, or a pause while
+    # other tracks sound, followed by the event of all notes sounding together. yields (track, event)
+    # slices shorter than a 64th note are no notes of their own
+    boundaries = index.get_boundaries(max(1, ticks_per_beat // 16))
+    if len(boundaries) < 2:
+        return
+
+    lengths = np.diff(boundaries)
+    times   = tempo_map.to_microseconds(boundaries[:-1]).tolist()
+    bars    = bar_index.get_bars(boundaries[:-1]).tolist()
+
+    # the slices are classified like notes, once per distinct length
+    labels = {}
+    unique = np.unique(lengths).tolist()
+    for length, (count, note_type) in zip(unique, get_slice_types(unique, ticks_per_beat)):
+        labels[length] = (f"{count} " if count > 1 else "") + note_type
+
+    for order, (tick, length) in enumerate(zip(boundaries[:-1].tolist(), lengths.tolist()), 1):
+        sounding  = index.stab(tick)
+        note_type = labels[length]
+        event     = processor.Event(case=1, key=constants.PAUSE, type=note_type, order=order, is_chord=False, time=times[order - 1], bar=bars[order - 1])
+
+        if len(sounding) > 0:
+            notes  = index.notes[sounding].tolist()
+            owners = index.tracks[sounding].tolist()
+            for track in tracks:
+                track_notes = [note for note, owner in zip(notes, owners) if owner == track]
+                if len(track_notes) == 0:
+                    yield track, event
+                else:
+                    yield track, event._replace(key=get_label(track_notes), is_chord=len(set(track_notes)) > 1)
+
+            event = event._replace(key=get_label(notes), is_chord=len(set(notes)) > 1)
+
+        yield SONORITY_TRACK, event
+
+def write_sonority_log(index, instruments, meta, output_dirs, compress, per_case, formats=constants.DEFAULT_FORMATS):
+    # index holds the notes of the tracks given with their instruments, output_dirs maps every granularity
+    # to its directory like merge.write_song_log. the aligned pauses and sonorities get a log of their own
+    # instead of being inserted into the track logs, whose events, cases and footprints stay comparable
+    # with the logs written without --sonorities
+    started   = profiling.begin()
+    tempo_map = meta["tempo_map"] if meta["tempo_map"] is not None else timing.TempoMap(meta["ticks_per_beat"])
+    bar_index = meta["bar_index"] if meta["bar_index"] is not None else timing.BarIndex(meta["ticks_per_beat"])
+
+    tracks      = [*instruments]
+    instruments = {**instruments, SONORITY_TRACK: SONORITY_INSTRUMENT}
+
+    writers = [merge.SongLogWriter(output_dir, measures, meta["start"], compress, per_case, formats, SONORITY_LOG) for measures, output_dir in output_dirs.items()]
+
+    events = 0
+    try:
+        for track, event in iter_sonorities(index, tracks, meta["ticks_per_beat"], tempo_map, bar_index):
+            for writer in writers:
+                writer.write(event, track, instruments[track])
+            events = events + 1
+    finally:
+        for writer in writers:
+            writer.close()
+
+    profiling.end("sonorities", started, events)
+    return events
+
+def main(args):
+    try:
+        reader = midi.MidiReader(args["MIDI_FILE"], clip=True)
+        tracks = args["--tracks"]
+        if tracks[0] == -1:
+            tracks = [*range(len(reader.tracks))]
+
+        if max(tracks) >= len(reader.tracks):
+            raise utils.ProcessMusicError("Highest tracks does not exist in MIDI file")
+
+        index = IntervalIndex.from_reader(reader, tracks)
+        if args["sounding"]:
+            found = index.stab(args["TICK"])
+        else:
+            meta      = processor.analyse_meta_tracks(reader)
+            bar_index = meta["bar_index"] if meta["bar_index"] is not None else timing.BarIndex(reader.ticks_per_beat)
+            found     = index.overlap(*bar_index.get_case_ticks(args["CASE"], args["--measures"]))
+    except utils.ProcessMusicError as e:
+        print(e)
+        sys.exit(1)
+
+    for i in found.tolist():
+        print(f"track {index.tracks[i]} {utils.KEYS[index.notes[i]]} [{index.starts[i]}, {index.ends[i]})")
+    print(f"{len(found)} notes found")
+
+if __name__ == '__main__':
+    args   = docopt(__doc__, version=constants.VERSION)
+    schema = Schema({
+        "sounding": bool,
+        "case": bool,
+        "MIDI_FILE": And(os.path.exists, error="MIDI_FILE should exist"),
+        "TICK": Or(None, And(Use(int), lambda x: x >= 0, error="Tick should be a positive number")),
+        "CASE": Or(None, And(Use(int), lambda x: x >= 1, error="Case should be a positive non-zero number")),
+        "--measures": And(Use(int), lambda x: x >= 0, error="Measures should be a positive number"),
+        "--tracks": And(Use(
+            lambda x: [*map(lambda a: int(a), x)]),
+            lambda x: (len(x) == 1 and -1 in x) or (sum(x) >= -1 and -1 not in x),
+            error="Tracks to examine should be a list of positive numbers or all by using -1"),
+        "--version": bool,
+        "--help": bool
+    })
+
+    try:
+        args = schema.validate(args)
+    except SchemaError as e:
+        print("Warning: invalid arguments given", e, "\n")
+        print(__doc__)
+        sys.exit(1)
+
+    main(args)
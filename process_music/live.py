@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+
+"""Process Music live. Turn a stream of MIDI messages into logs while it is played, case by case
+
+Usage:
+    live.py stdin [options]
+    live.py socket [--host HOST] [--port PORT] [options]
+    live.py replay [--speed SPEED] [options] MIDI_FILE
+    live.py (-h | --help)
+    live.py (-v | --version)
+
+Options:
+    -h --help               Show help.
+    -v --version            Show version information.
+    --host HOST             The host to listen on for a client sending messages [default: 127.0.0.1].
+    --port PORT             The port to listen on for a client sending messages [default: 8766].
+    --speed SPEED           The speed the MIDI file is replayed with, e.g. 2 for twice as fast. Zero replays
+                            it as fast as possible [default: 1].
+    --measures MEASURES     The number of measures you want to define for a case. Zero defines everything as trace / case [default: 1].
+    --output_dir DIR        The output directory where the logs of each channel are stored [default: pm_live].
+    --ticks_per_beat TPB    The resolution of the ticks of the incoming messages [default: 480].
+    --tempo TEMPO           The tempo of the incoming messages in microseconds per beat [default: 500000].
+    --time_signature SIG    The time signature of the incoming messages setting the bar lines [default: 4/4].
+    --gzip                  Store the XES logs gzip-compressed (.xes.gz).
+    --per_case              Consider only transitions within a case for the footprint matrix.
+    --quiet                 Do not echo the finished events and cases.
+
+stdin and socket read one message per line in the text format of mido, e.g. 'note_on channel=0 note=60 velocity=64 time=0',
+where time are the ticks since the previous message. replay takes ticks per beat, tempo and time signature from the file.
+The events of each channel are written to channel_<n>.csv as soon as their note ends, replay writes the events of each
+channel of a track to track_<i>_channel_<n>.csv. The trace of a case is written to the XES log once no sounding note can
+add to it anymore. Whenever the stream passes the bar line of a case, the files are flushed and the footprint matrix of
+each channel is updated.
+
+Copyright:
+    (c) by K-u-K (imperial Keller Patrick & royal Kocaj Alen) 2020
+"""
+from docopt import docopt
+from schema import Schema, And, Use, Or, SchemaError
+
+import mido
+
+import constants
+import footprint
+import midi
+import processor
+import timing
+import utils
+import xes
+
+import datetime
+import heapq
+import os
+import socket
+import sys
+import time
+
+# the number of classified durations a processor keeps, whatever the length of the session
+CACHE_SIZE = 4096
+
+class ChannelWriter:
+    # the log files of a single channel, written event by event. the footprint is counted along
+    # and its matrix rewritten as a whole whenever a case is closed
+    def __init__(self, output_dir, name, start, compress, per_case):
+        self.output_dir = output_dir
+        self.name       = name
+        self.start      = start
+        self.events     = 0
+
+        self.csv = open(os.path.join(output_dir, f"{name}.csv"), "w")
+        self.csv.write("Case_ID;Event;Type;Order;Is_Chord;Timestamp\n")
+
+        self.xes     = xes.XesWriter(os.path.join(output_dir, f"{name}.xes"), start, compress)
+        self.counter = footprint.TransitionCounter(per_case)
+
+        # the events of the cases not yet written to the XES log, by case in the order of their first event
+        self.pending = {}
+
+    def write(self, event):
+        self.csv.write("{};{};{};{};{};{}\n".format(
+            event.case,
+            event.key,
+            event.type,
+            event.order,
+            event.is_chord,
+            utils.format_timestamp(self.start, event.time)
+        ))
+
+        self.pending.setdefault(event.case, []).append(event)
+        self.counter.add(event.key, event.case)
+        self.events = self.events + 1
+
+    def release(self, open_case=None):
+        # the traces of the cases before open_case are complete, they are written in the order of their first
+        # event like the traces of a track log. a complete case behind an open one waits for it
+        for case in [*self.pending]:
+            if open_case is not None and case >= open_case:
+                break
+
+            for event in self.pending.pop(case):
+                self.xes.write(event)
+            self.counter.close_case(case)
+
+    def flush(self):
+        self.csv.flush()
+        self.xes.fh.flush()
+
+        # readers of the matrix never see a half written file
+        footprint_path   = os.path.join(self.output_dir, f"{self.name}_footprint_matrix.txt")
+        footprint_matrix = footprint.calculate_footprint_symbols(self.counter.counts)
+        with open(f"{footprint_path}.tmp", "w") as fh:
+            fh.write(footprint_matrix.to_string())
+        os.replace(f"{footprint_path}.tmp", footprint_path)
+
+    def close(self):
+        self.release()
+        self.flush()
+        self.csv.close()
+        self.xes.close()
+
+class LiveSession:
+    # runs a processor per channel on the messages of a stream, or per channel of each track of a replayed
+    # file. messages come with their absolute tick in the stream, each processor gets the ticks since the
+    # previous message of its own channel
+    def __init__(self, output_dir, ticks_per_beat, tempo_map, bar_index, measures, start, compress=False, per_case=False, quiet=False):
+        self.output_dir     = output_dir
+        self.ticks_per_beat = ticks_per_beat
+        self.tempo_map      = tempo_map
+        self.bar_index      = bar_index
+        self.measures       = measures
+        self.start          = start
+        self.compress       = compress
+        self.per_case       = per_case
+        self.quiet          = quiet
+
+        self.processors = {}
+        self.writers    = {}
+        self.ticks      = {}
+        self.case       = 1
+        self.events     = 0
+
+    def get_channel(self, track, channel):
+        # track is None for the messages of a stream
+        voice = (track, channel)
+        if voice not in self.processors:
+            name = f"channel_{channel}" if track is None else f"track_{track}_channel_{channel}"
+            self.processors[voice] = processor.TrackProcessor(self.ticks_per_beat, self.tempo_map, self.bar_index, self.measures)
+            self.writers[voice]    = ChannelWriter(self.output_dir, name, self.start, self.compress, self.per_case)
+            self.ticks[voice]      = 0
+
+        return self.processors[voice], self.writers[voice]
+
+    def feed(self, tick, track, msg):
+        # a case is closed by the first message beyond its last bar line
+        case = timing.get_case(self.bar_index.get_bar(tick), self.measures)
+        if case > self.case:
+            self.close_case()
+            self.case = case
+
+        if msg.type not in constants.NOTE_EVENTS:
+            return
+
+        voice                   = (track, msg.channel)
+        track_processor, writer = self.get_channel(*voice)
+        delta                   = tick - self.ticks[voice]
+        self.ticks[voice]       = tick
+
+        try:
+            events = track_processor.feed(msg.copy(time=delta))
+        except utils.ProcessMusicError as e:
+            print(f"Warning: message '{msg}' skipped: {e}", file=sys.stderr)
+            return
+
+        for event in events:
+            writer.write(event)
+            if not self.quiet:
+                print(f"{writer.name} case {event.case} {event.key} {event.type} order={event.order} is_chord={event.is_chord}")
+
+        if len(events) > 0:
+            writer.release(track_processor.get_open_case())
+
+        self.events = self.events + len(events)
+
+    def close_case(self):
+        for voice, writer in self.writers.items():
+            writer.release(self.processors[voice].get_open_case())
+            writer.flush()
+            self.processors[voice].trim(CACHE_SIZE)
+
+        if not self.quiet:
+            print(f"case {self.case} closed, {self.events} events so far")
+
+    def close(self):
+        for voice, track_processor in self.processors.items():
+            for event in track_processor.flush():
+                self.writers[voice].write(event)
+
+        for writer in self.writers.values():
+            writer.close()
+
+def iter_lines(lines):
+    # (absolute tick, None, message) of the mido text lines of a stream, time being the ticks since the previous
+    # line. a stream has no tracks
+    tick = 0
+    for line in lines:
+        line = line.strip()
+        if len(line) == 0 or line.startswith("#"):
+            continue
+
+        try:
+            msg = mido.parse_string(line)
+        except (LookupError, ValueError, TypeError) as e:
+            print(f"Warning: invalid message '{line}' skipped: {e}", file=sys.stderr)
+            continue
+
+        tick = tick + msg.time
+        yield tick, None, msg
+
+def iter_socket(host, port):
+    # messages of the first client connecting, the stream ends with its connection
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        server.bind((host, port))
+        server.listen(1)
+        print(f"Waiting for messages on {host}:{port}", file=sys.stderr)
+
+        connection, _ = server.accept()
+        with connection, connection.makefile("r", encoding="utf-8") as fh:
+            yield from iter_lines(fh)
+    finally:
+        server.close()
+
+def iter_track_ticks(i, track):
+    tick = 0
+    for msg in track:
+        tick = tick + msg.time
+        yield tick, i, msg
+
+def iter_replay(reader, tempo_map, speed):
+    # (absolute tick, track, message) of all tracks merged by tick and released at the time they are played.
+    # speed zero releases them right away
+    tracks  = [iter_track_ticks(i, track) for i, track in enumerate(reader.tracks)]
+    started = time.monotonic()
+    for tick, i, msg in heapq.merge(*tracks, key=lambda entry: entry[0]):
+        if speed > 0:
+            delay = tempo_map.get_microseconds(tick) / 1000000 / speed - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+        yield tick, i, msg
+
+def main(args):
+    output_dir = args["--output_dir"]
+    start      = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    try:
+        if args["replay"]:
+            reader    = midi.MidiReader(args["MIDI_FILE"], clip=True)
+            meta      = processor.analyse_meta_tracks(reader)
+            tpb       = meta["ticks_per_beat"]
+            tempo_map = meta["tempo_map"] if meta["tempo_map"] is not None else timing.TempoMap(tpb)
+            bar_index = meta["bar_index"] if meta["bar_index"] is not None else timing.BarIndex(tpb)
+            messages  = iter_replay(reader, tempo_map, args["--speed"])
+        else:
+            tpb       = args["--ticks_per_beat"]
+            tempo_map = timing.TempoMap(tpb, [(0, args["--tempo"])])
+            bar_index = timing.BarIndex(tpb, [(0, args["--time_signature"])])
+            if args["socket"]:
+                messages = iter_socket(args["--host"], args["--port"])
+            else:
+                messages = iter_lines(sys.stdin)
+    except utils.ProcessMusicError as e:
+        print(e)
+        sys.exit(1)
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    session = LiveSession(output_dir, tpb, tempo_map, bar_index, args["--measures"], start, args["--gzip"], args["--per_case"], args["--quiet"])
+    try:
+        for tick, track, msg in messages:
+            session.feed(tick, track, msg)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        session.close()
+
+    print(f"Stream processed. {session.events} events of {len(session.writers)} channels in {session.case} cases generated in directory '{output_dir}'")
+
+def parse_time_signature(value):
+    numerator, denominator = value.split("/")
+    time_signature         = mido.MetaMessage("time_signature", numerator=int(numerator), denominator=int(denominator))
+    utils.get_time_signature_ticks(time_signature, 1, 1)
+    return time_signature
+
+if __name__ == '__main__':
+    args   = docopt(__doc__, version=constants.VERSION)
+    schema = Schema({
+        "stdin": bool,
+        "socket": bool,
+        "replay": bool,
+        "MIDI_FILE": Or(None, And(os.path.exists, error="MIDI_FILE should exist")),
+        "--host": str,
+        "--port": And(Use(int), lambda x: 0 < x < 65536, error="Port should be a number between 1 and 65535"),
+        "--speed": And(Use(float), lambda x: x >= 0, error="Speed should be a positive number"),
+        "--measures": And(Use(int), lambda x: x >= 0, error="Measures should be a positive number"),
+        "--output_dir": str,
+        "--ticks_per_beat": And(Use(int), lambda x: x > 0, error="Ticks per beat should be a positive non-zero number"),
+        "--tempo": And(Use(int), lambda x: x > 0, error="Tempo should be a positive non-zero number"),
+        "--time_signature": Use(parse_time_signature, error="Time signature should be given like 3/4 with a supported denominator"),
+        "--gzip": bool,
+        "--per_case": bool,
+        "--quiet": bool,
+        "--version": bool,
+        "--help": bool
+    })
+
+    try:
+        args = schema.validate(args)
+    except SchemaError as e:
+        print("Warning: invalid arguments given", e, "\n")
+        print(__doc__)
+        sys.exit(1)
+
+    main(args)
@@ -0,0 +1,97 @@
+import numpy as np
+
+import constants
+import footprint
+import profiling
+import timing
+import utils
+import xes
+
+import os
+
+SONG_LOG = "song_log"
+
+def get_song_order(tables, measures=1):
+    # the positions of the events of all tables, concatenated in the order of the tracks, sorted by case and
+    # within a case by time. events of the same time keep the order of the tracks and of the track logs
+    empty = np.zeros(0, dtype=np.int64)
+    times = np.concatenate([empty] + [table.time for table in tables.values()])
+    bars  = np.concatenate([empty] + [table.bar for table in tables.values()])
+    return np.lexsort((np.arange(len(times)), times, timing.get_cases(bars, measures)))
+
+class SongLogWriter:
+    # writes the merged events of one granularity to the song log files as they come in
+    def __init__(self, output_dir, measures, start, compress, per_case, formats, name=SONG_LOG):
+        self.output_dir = output_dir
+        self.name       = name
+        self.measures   = measures
+        self.start      = start
+        self.csv        = None
+        self.xes        = None
+        self.counter    = None
+        self.events     = 0
+
+        if constants.FORMAT_CSV in formats:
+            self.csv = open(os.path.join(output_dir, f"{name}.csv"), "w")
+            self.csv.write("Case_ID;Event;Type;Order;Is_Chord;Timestamp;Track;Instrument\n")
+        if constants.FORMAT_XES in formats:
+            self.xes = xes.XesWriter(os.path.join(output_dir, f"{name}.xes"), start, compress)
+        if constants.FORMAT_FOOTPRINT in formats:
+            self.counter = footprint.TransitionCounter(per_case)
+
+    def write(self, event, track, instrument):
+        # the case of the event follows the granularity of this writer
+        event       = event._replace(case=timing.get_case(event.bar, self.measures))
+        self.events = self.events + 1
+
+        if self.csv is not None:
+            self.csv.write("{};{};{};{};{};{};{};{}\n".format(
+                event.case,
+                event.key,
+                event.type,
+                event.order,
+                event.is_chord,
+                utils.format_timestamp(self.start, event.time),
+                track,
+                instrument
+            ))
+
+        if self.xes is not None:
+            self.xes.write_song_event(event, track, instrument)
+
+        # transitions are counted within each track, the matrix combines all of them
+        if self.counter is not None:
+            self.counter.add(event.key, event.case, track)
+
+    def close(self):
+        if self.csv is not None:
+            self.csv.close()
+        if self.xes is not None:
+            self.xes.close()
+
+        if self.counter is not None:
+            footprint_matrix = footprint.calculate_footprint_symbols(self.counter.counts)
+            with open(os.path.join(self.output_dir, f"{self.name}_footprint_matrix.txt"), "w") as fh:
+                fh.write(footprint_matrix.to_string())
+
+def write_song_log(tables, instruments, meta, output_dirs, compress, per_case, formats=constants.DEFAULT_FORMATS):
+    # tables and instruments are given by track, the tables are the events of the track logs. output_dirs
+    # maps every granularity to its directory
+    started = profiling.begin()
+    writers = [SongLogWriter(output_dir, measures, meta["start"], compress, per_case, formats) for measures, output_dir in output_dirs.items()]
+
+    # a note is logged at its note_off but belongs to the case of its note_on, so ordering by time alone would
+    # split the cases of notes held into later ones. every granularity has cases of its own, so the events
+    # are ordered for each writer
+    events = [(i, event) for i, table in tables.items() for event in table]
+    try:
+        for writer in writers:
+            for index in get_song_order(tables, writer.measures).tolist():
+                i, event = events[index]
+                writer.write(event, i, instruments[i])
+    finally:
+        for writer in writers:
+            writer.close()
+
+    profiling.end("merge", started, len(events))
+    return len(events)
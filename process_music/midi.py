@@ -0,0 +1,137 @@
+from mido.midifiles.meta import build_meta_message
+from mido.messages.specs import SPEC_BY_STATUS
+import mido
+
+import utils
+
+import mmap
+import struct
+
+def _read_variable_int(data, offset):
+    value = 0
+    while True:
+        byte   = data[offset]
+        offset = offset + 1
+        value  = (value << 7) | (byte & 0x7f)
+        if byte < 0x80:
+            return value, offset
+
+def decode_track(data, start, end, clip=True):
+    # decode the messages of one MTrk chunk lazily, mirroring mido's track parser
+    offset      = start
+    last_status = None
+
+    while offset < end:
+        delta, offset = _read_variable_int(data, offset)
+        status_byte   = data[offset]
+        offset        = offset + 1
+
+        if status_byte < 0x80:
+            if last_status is None:
+                raise utils.ProcessMusicError("running status without last_status")
+            peek_data   = [status_byte]
+            status_byte = last_status
+        else:
+            # meta messages don't set running status
+            if status_byte != 0xff:
+                last_status = status_byte
+            peek_data = []
+
+        if status_byte == 0xff:
+            meta_type      = data[offset]
+            length, offset = _read_variable_int(data, offset + 1)
+            yield build_meta_message(meta_type, [*data[offset:offset + length]], delta)
+            offset = offset + length
+        elif status_byte in [0xf0, 0xf7]:
+            length, offset = _read_variable_int(data, offset)
+            sysex          = [*data[offset:offset + length]]
+            offset         = offset + length
+
+            if sysex and sysex[-1] == 0xf7:
+                sysex = sysex[:-1]
+            if clip:
+                sysex = [byte if byte < 127 else 127 for byte in sysex]
+
+            yield mido.Message("sysex", data=sysex, time=delta)
+        else:
+            spec = SPEC_BY_STATUS.get(status_byte)
+            if spec is None:
+                raise utils.ProcessMusicError(f"undefined status byte 0x{status_byte:02x}")
+
+            size       = spec["length"] - 1 - len(peek_data)
+            data_bytes = peek_data + [*data[offset:offset + size]]
+            offset     = offset + size
+
+            if clip:
+                data_bytes = [byte if byte < 127 else 127 for byte in data_bytes]
+            elif any(byte > 127 for byte in data_bytes):
+                raise utils.ProcessMusicError("data byte must be in range 0..127")
+
+            yield mido.Message.from_bytes([status_byte] + data_bytes, time=delta)
+
+def get_track_name(messages):
+    for msg in messages:
+        if msg.is_meta and msg.type == "track_name":
+            return msg.name
+    return ""
+
+class LazyTrack:
+    # a track of a MIDI file which is only decoded while it is iterated. it holds nothing
+    # but the location of its chunk, so it is cheap to keep and to hand to worker processes
+    def __init__(self, filename, start, end, clip=True):
+        self.filename = filename
+        self.start    = start
+        self.end      = end
+        self.clip     = clip
+        self.messages = None
+
+    def __iter__(self):
+        if self.messages is not None:
+            yield from self.messages
+            return
+
+        with open(self.filename, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield from decode_track(data, self.start, self.end, self.clip)
+
+    def decode(self):
+        # the messages as a list, kept for every later pass over the track instead of decoding it again
+        if self.messages is None:
+            self.messages = [*self]
+        return self.messages
+
+    def raw(self):
+        with open(self.filename, "rb") as fh:
+            fh.seek(self.start)
+            return fh.read(self.end - self.start)
+
+    @property
+    def name(self):
+        return get_track_name(self)
+
+class MidiReader:
+    # memory-maps a MIDI file and indexes the offsets of its MTrk chunks without decoding any message
+    def __init__(self, filename, clip=True):
+        self.filename = filename
+        self.tracks   = []
+
+        with open(filename, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if len(data) < 14 or data[0:4] != b"MThd":
+                raise utils.ProcessMusicError(f"'{filename}' is not a MIDI file")
+
+            length = struct.unpack(">L", data[4:8])[0]
+            self.type, number_of_tracks, self.ticks_per_beat = struct.unpack(">hhh", data[8:14])
+
+            offset = 8 + length
+            while len(self.tracks) < number_of_tracks:
+                if offset + 8 > len(data):
+                    raise utils.ProcessMusicError(f"'{filename}' misses {number_of_tracks - len(self.tracks)} track chunks")
+
+                name, length = struct.unpack(">4sL", data[offset:offset + 8])
+                start        = offset + 8
+                offset       = start + length
+
+                if offset > len(data):
+                    raise utils.ProcessMusicError(f"'{filename}' has a truncated track chunk")
+
+                if name == b"MTrk":
+                    self.tracks.append(LazyTrack(filename, start, offset, clip))
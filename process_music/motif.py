@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+
+"""Process Music motif index. Find recurring melodic fragments in the track logs of a corpus
+
+Usage:
+    motif.py add [--n N] [--types] INDEX_DIR SOURCES...
+    motif.py search [--near] [--limit LIMIT] INDEX_DIR (--intervals INTERVALS | NOTES...)
+    motif.py compact INDEX_DIR
+    motif.py (-h | --help)
+    motif.py (-v | --version)
+
+Options:
+    -h --help               Show help.
+    -v --version            Show version information.
+    --n N                   The number of intervals of an indexed fragment, fixed when the index is created [default: 4].
+    --types                 Index the note types next to the intervals, fixed when the index is created.
+    --near                  Also find fragments with single notes off by a semitone or up to half of them not matching.
+    --limit LIMIT           The maximum number of matches shown [default: 20].
+    --intervals INTERVALS   Search for comma separated intervals in semitones, e.g. 2,2,-4,... instead of notes.
+
+SOURCES can be directories searched recursively for track logs (track_N.csv or track_N.npz) or log files. Logs already
+in the index are skipped, every call of add writes a new segment and compact merges all segments into one.
+
+NOTES are note names like E4 D4 C4 D4 E4. Fragments are transposition invariant, i.e. the same intervals in any key match.
+An index with note types needs the type of every note, e.g. "E4/quarter note". The melody of a track is its highest note
+at each point in time, pauses are skipped.
+
+Copyright:
+    (c) by K-u-K (imperial Keller Patrick & royal Kocaj Alen) 2020
+"""
+from docopt import docopt
+from schema import Schema, And, Use, Or, SchemaError
+
+import numpy as np
+
+import constants
+import store
+import utils
+
+import csv
+import glob
+import json
+import os
+import re
+import shutil
+import sys
+import time
+import zlib
+
+MANIFEST   = "index.json"
+LOG_NAME   = re.compile(r"^track_\d+\.(csv|npz)$")
+ARRAYS     = ["keys", "notes", "cases", "orders", "starts"]
+
+# 64 bit FNV-1a over the intervals (and note types) of a fragment
+FNV_OFFSET = np.uint64(14695981039346656037)
+FNV_PRIME  = np.uint64(1099511628211)
+
+def get_type_values(types):
+    return np.array([zlib.crc32(note_type.encode()) for note_type in types], dtype=np.uint64)
+
+def hash_fragments(intervals, type_values, n):
+    # the keys of all fragments of n intervals, one per start note
+    count = len(intervals) - n + 1
+    if count <= 0:
+        return np.zeros(0, dtype=np.uint64)
+
+    intervals = np.asarray(intervals, dtype=np.int64) + 256
+    keys      = np.full(count, FNV_OFFSET, dtype=np.uint64)
+    for k in range(n):
+        keys = (keys ^ intervals[k:k + count].astype(np.uint64)) * FNV_PRIME
+
+    if type_values is not None:
+        for k in range(n + 1):
+            keys = (keys ^ type_values[k:k + count]) * FNV_PRIME
+
+    return keys
+
+def read_melody(filename):
+    # the highest note of each order of a track log, as MIDI note numbers with their note type, case and order
+    if filename.endswith(".npz"):
+        table  = store.EventTable.load(filename)
+        events = zip(table.key.tolist(), [table.types[t] for t in table.type.tolist()], table.case.tolist(), table.order.tolist())
+    else:
+        with open(filename, newline="") as fh:
+            rows   = [*csv.DictReader(fh, delimiter=";")]
+        events = [(store.KEY_CODES.get(row["Event"], store.PAUSE), row["Type"], int(row["Case_ID"]), int(row["Order"])) for row in rows]
+
+    melody = []
+    for key, note_type, case, order in events:
+        # pauses and folded chords are no melody notes
+        if key >= store.PAUSE:
+            continue
+
+        # the notes of a chord share their order
+        if len(melody) > 0 and melody[-1][3] == order:
+            if key > melody[-1][0]:
+                melody[-1] = (key, note_type, case, order)
+            continue
+
+        melody.append((key, note_type, case, order))
+
+    return melody
+
+def collect_logs(sources):
+    # event tables are preferred over the CSV of the same track
+    filenames = []
+    for source in sources:
+        if os.path.isdir(source):
+            candidates = sorted(glob.glob(os.path.join(source, "**", "track_*"), recursive=True))
+        else:
+            candidates = sorted(glob.glob(source))
+
+        for candidate in candidates:
+            if LOG_NAME.match(os.path.basename(candidate)) is None:
+                continue
+
+            candidate = os.path.abspath(candidate)
+            if candidate.endswith(".csv") and os.path.exists(f"{candidate[:-4]}.npz"):
+                continue
+
+            if candidate not in filenames:
+                filenames.append(candidate)
+
+    return filenames
+
+def get_document(filename):
+    # song and track of a log, granularity sub directories are skipped
+    directory = os.path.dirname(filename)
+    if os.path.basename(directory).startswith("measures_"):
+        directory = os.path.dirname(directory)
+
+    return {"song": os.path.basename(directory), "track": os.path.splitext(os.path.basename(filename))[0], "path": filename}
+
+class MotifIndex:
+    # fragments of n intervals mapped to the note they start at. every segment holds the sorted fragment keys with
+    # the index of their start note and per note its case and order, starts gives the first note of each document
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST)) as fh:
+            self.manifest = json.load(fh)
+
+        self.n        = self.manifest["n"]
+        self.types    = self.manifest["types"]
+        self.segments = {}
+
+    @classmethod
+    def open(cls, directory, n=4, types=False):
+        # the parameters only apply to a new index, an existing one keeps its own
+        if not os.path.exists(os.path.join(directory, MANIFEST)):
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+
+            manifest = {"version": constants.VERSION, "n": n, "types": types, "next_segment": 1, "segments": []}
+            with open(os.path.join(directory, MANIFEST), "w") as fh:
+                json.dump(manifest, fh, indent=2)
+
+        return cls(directory)
+
+    def save_manifest(self):
+        with open(os.path.join(self.directory, MANIFEST), "w") as fh:
+            json.dump(self.manifest, fh, indent=2)
+
+    def get_segment(self, name):
+        # the arrays are memory mapped, a query only touches the pages of the keys it looks up
+        if name not in self.segments:
+            path = os.path.join(self.directory, name)
+            self.segments[name] = {array: np.load(os.path.join(path, f"{array}.npy"), mmap_mode="r") for array in ARRAYS}
+        return self.segments[name]
+
+    def write_segment(self, arrays, documents):
+        name = f"segment_{self.manifest['next_segment']:06d}"
+        path = os.path.join(self.directory, name)
+        os.makedirs(path)
+        for array in ARRAYS:
+            np.save(os.path.join(path, f"{array}.npy"), arrays[array])
+
+        self.manifest["next_segment"] = self.manifest["next_segment"] + 1
+        self.manifest["segments"].append({"name": name, "documents": documents})
+        return name
+
+    def get_documents(self):
+        return [document for segment in self.manifest["segments"] for document in segment["documents"]]
+
+    def add(self, filenames):
+        # index the logs not indexed yet as a new segment, returns the number of new documents
+        indexed   = {document["path"] for document in self.get_documents()}
+        documents = []
+        keys      = []
+        notes     = []
+        cases     = []
+        orders    = []
+        starts    = [0]
+        for filename in filenames:
+            if filename in indexed:
+                continue
+
+            melody  = read_melody(filename)
+            pitches = np.array([note[0] for note in melody], dtype=np.int64)
+            values  = get_type_values([note[1] for note in melody]) if self.types else None
+
+            fragments = hash_fragments(np.diff(pitches), values, self.n)
+            keys.append(fragments)
+            notes.append(np.arange(len(fragments), dtype=np.int64) + starts[-1])
+            cases.append(np.array([note[2] for note in melody], dtype=np.int32))
+            orders.append(np.array([note[3] for note in melody], dtype=np.int32))
+            starts.append(starts[-1] + len(melody))
+            documents.append(get_document(filename))
+
+        if len(documents) == 0:
+            return 0
+
+        self.write_segment(sort_arrays({
+            "keys":   np.concatenate(keys),
+            "notes":  np.concatenate(notes),
+            "cases":  np.concatenate(cases),
+            "orders": np.concatenate(orders),
+            "starts": np.array(starts, dtype=np.int64)
+        }), documents)
+        self.save_manifest()
+
+        return len(documents)
+
+    def compact(self):
+        # merge all segments into one, note indices and document starts are shifted by the notes before
+        segments = self.manifest["segments"]
+        if len(segments) < 2:
+            return len(segments)
+
+        arrays    = {array: [] for array in ARRAYS}
+        documents = []
+        offset    = 0
+        for segment in segments:
+            arrays_of_segment = self.get_segment(segment["name"])
+            arrays["keys"].append(np.asarray(arrays_of_segment["keys"]))
+            arrays["notes"].append(np.asarray(arrays_of_segment["notes"]) + offset)
+            arrays["cases"].append(np.asarray(arrays_of_segment["cases"]))
+            arrays["orders"].append(np.asarray(arrays_of_segment["orders"]))
+            arrays["starts"].append(np.asarray(arrays_of_segment["starts"])[:-1] + offset)
+            documents.extend(segment["documents"])
+            offset = offset + len(arrays_of_segment["cases"])
+
+        arrays["starts"].append(np.array([offset], dtype=np.int64))
+
+        self.manifest["segments"] = []
+        self.write_segment(sort_arrays({array: np.concatenate(values) for array, values in arrays.items()}), documents)
+        self.save_manifest()
+
+        self.segments = {}
+        for segment in segments:
+            shutil.rmtree(os.path.join(self.directory, segment["name"]))
+
+        return 1
+
+    def get_query(self, intervals, types=None, near=False):
+        # (offset, errors, key) of every fragment of the query. near adds the variants with one note
+        # off by a semitone, counted as one error
+        intervals = np.asarray(intervals, dtype=np.int64)
+        if self.types and types is None:
+            raise utils.ProcessMusicError("The index contains note types, the query needs the type of every note")
+
+        fragments = len(intervals) - self.n + 1
+        if fragments < 1:
+            raise utils.ProcessMusicError(f"A query needs at least {self.n} intervals, i.e. {self.n + 1} notes")
+
+        values = get_type_values(types) if self.types else None
+        query  = [(offset, 0, key) for offset, key in enumerate(hash_fragments(intervals, values, self.n))]
+        if near:
+            # moving a note changes the interval before and after it
+            for position in range(len(intervals) + 1):
+                for delta in [-1, 1]:
+                    variant = intervals.copy()
+                    if position > 0:
+                        variant[position - 1] = variant[position - 1] + delta
+                    if position < len(intervals):
+                        variant[position] = variant[position] - delta
+
+                    keys = hash_fragments(variant, values, self.n)
+                    for offset in range(max(0, position - self.n), min(fragments, position + 1)):
+                        query.append((offset, 1, keys[offset]))
+
+        return query, fragments
+
+    def search(self, intervals, types=None, near=False, limit=20):
+        # a match starts at the note a fragment of the query starts at minus its offset in the query. exact matches
+        # contain every fragment, near ones at least half of them. matches with less missing fragments come first,
+        # then the ones with less intervals off by a semitone
+        query, fragments = self.get_query(intervals, types, near)
+
+        matches = []
+        for segment in self.manifest["segments"]:
+            arrays = self.get_segment(segment["name"])
+            keys   = arrays["keys"]
+            starts = np.asarray(arrays["starts"])
+
+            found_starts  = []
+            found_offsets = []
+            found_errors  = []
+            for offset, errors, key in query:
+                lower = np.searchsorted(keys, key, "left")
+                upper = np.searchsorted(keys, key, "right")
+                if lower == upper:
+                    continue
+
+                notes     = np.asarray(arrays["notes"][lower:upper])
+                documents = np.searchsorted(starts, notes, "right") - 1
+                notes     = notes[notes - offset >= starts[documents]]
+
+                found_starts.append(notes - offset)
+                found_offsets.append(np.full(len(notes), offset, dtype=np.int64))
+                found_errors.append(np.full(len(notes), errors, dtype=np.int64))
+
+            if len(found_starts) == 0:
+                continue
+
+            found_starts  = np.concatenate(found_starts)
+            found_offsets = np.concatenate(found_offsets)
+            found_errors  = np.concatenate(found_errors)
+
+            # the fewest errors of every fragment of a match, then the fragments and errors per match
+            order         = np.lexsort((found_errors, found_offsets, found_starts))
+            found_starts  = found_starts[order]
+            found_offsets = found_offsets[order]
+            found_errors  = found_errors[order]
+
+            first         = np.ones(len(found_starts), dtype=np.bool_)
+            first[1:]     = (found_starts[1:] != found_starts[:-1]) | (found_offsets[1:] != found_offsets[:-1])
+            found_starts  = found_starts[first]
+            found_errors  = found_errors[first]
+
+            candidates, index, covered = np.unique(found_starts, return_index=True, return_counts=True)
+            errors  = np.add.reduceat(found_errors, index)
+            missing = fragments - covered
+
+            valid = (missing == 0) & (errors == 0) if not near else covered * 2 >= fragments
+            for note, error, count in zip(candidates[valid].tolist(), errors[valid].tolist(), missing[valid].tolist()):
+                matches.append((count, error, segment, note))
+
+        matches.sort(key=lambda match: match[:2])
+        return [self.create_match(segment, note, missing, errors, fragments) for missing, errors, segment, note in matches[:limit]]
+
+    def create_match(self, segment, note, missing, errors, fragments):
+        arrays   = self.get_segment(segment["name"])
+        document = segment["documents"][int(np.searchsorted(arrays["starts"], note, "right")) - 1]
+        return {
+            "song":      document["song"],
+            "track":     document["track"],
+            "path":      document["path"],
+            "case":      int(arrays["cases"][note]),
+            "order":     int(arrays["orders"][note]),
+            "exact":     missing == 0 and errors == 0,
+            "missing":   missing,
+            "errors":    errors,
+            "fragments": fragments
+        }
+
+def sort_arrays(arrays):
+    order = np.argsort(arrays["keys"], kind="stable")
+    arrays["keys"]  = arrays["keys"][order]
+    arrays["notes"] = arrays["notes"][order]
+    return arrays
+
+def parse_notes(notes):
+    # note names with an optional note type, e.g. E4 or E4/quarter note
+    keys  = []
+    types = []
+    for note in notes:
+        key, _, note_type = note.partition("/")
+        if key not in store.KEY_CODES or key == constants.PAUSE:
+            raise utils.ProcessMusicError(f"'{key}' is not a note name like C4 or F#3")
+
+        keys.append(store.KEY_CODES[key])
+        types.append(note_type)
+
+    return np.diff(keys), types if all(types) else None
+
+def main(args):
+    try:
+        if args["add"]:
+            index = MotifIndex.open(args["INDEX_DIR"], args["--n"], args["--types"])
+            added = index.add(collect_logs(args["SOURCES"]))
+            print(f"{added} track logs added to the index in directory '{args['INDEX_DIR']}'")
+        elif args["compact"]:
+            segments = MotifIndex(args["INDEX_DIR"]).compact()
+            print(f"Index in directory '{args['INDEX_DIR']}' compacted to {segments} segment(s)")
+        else:
+            index = MotifIndex(args["INDEX_DIR"])
+            if args["--intervals"] is not None:
+                intervals, types = args["--intervals"], None
+            else:
+                intervals, types = parse_notes(args["NOTES"])
+
+            start   = time.perf_counter()
+            matches = index.search(intervals, types, args["--near"], args["--limit"])
+            seconds = time.perf_counter() - start
+
+            for match in matches:
+                quality = "exact" if match["exact"] else f"near, {match['fragments'] - match['missing']}/{match['fragments']} fragments"
+                print(f"{match['song']} {match['track']} case {match['case']} order {match['order']} ({quality})")
+            print(f"{len(matches)} matches in {seconds:.3f}s")
+    except utils.ProcessMusicError as e:
+        print(e)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    args   = docopt(__doc__, version=constants.VERSION)
+    schema = Schema({
+        "add": bool,
+        "search": bool,
+        "compact": bool,
+        "INDEX_DIR": str,
+        "SOURCES": [str],
+        "NOTES": [str],
+        "--n": And(Use(int), lambda x: x >= 1, error="N should be a positive non-zero number"),
+        "--types": bool,
+        "--near": bool,
+        "--limit": And(Use(int), lambda x: x >= 1, error="Limit should be a positive non-zero number"),
+        "--intervals": Or(None, And(Use(lambda x: [int(i) for i in x.split(",")]), len, error="Intervals should be a comma separated list of numbers")),
+        "--version": bool,
+        "--help": bool
+    })
+
+    try:
+        args = schema.validate(args)
+    except SchemaError as e:
+        print("Warning: invalid arguments given", e, "\n")
+        print(__doc__)
+        sys.exit(1)
+
+    main(args)
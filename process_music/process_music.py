@@ -3,280 +3,368 @@
 """Process Music. Explorative analysis of songs and music from the perspective of a log file
 
 Usage:
-    process_music.py [--measures MEASURES] [--output_dir OUTPUT_DIR] [--tracks TRACKS...] MIDI_FILE
+    process_music.py [--measures MEASURES] [--output_dir OUTPUT_DIR] [--tracks TRACKS...] [--gzip] [--per_case] [--jobs JOBS] [--cache_dir CACHE_DIR] [--cache_size SIZE] [--profile] [--profile_memory] [--formats FORMATS] [--merge] [--chords] [--sonorities] [--split_channels] MIDI_FILE
     process_music.py (-h | --help)
     process_music.py (-v | --version)
 
 Options:
     -h --help               Show help.
     -v --version            Show version information.
-    --measures MEASURES     The number of measures you want to define for a case. Zero defines everything as trace / case [default: 1].
+    --measures MEASURES     The number of measures you want to define for a case. Zero defines everything as trace / case.
+                            Comma separated values write one log per granularity into measures_<value> sub directories [default: 1].
     --output_dir OUTPUT_DIR The output directory where the final XES logs of each track are stored [default: pm_tracks].
     --tracks TRACKS....     Which tracks to consider. Multiple values possible. A negative value of -1 takes all [default: -1]
+    --gzip                  Store the XES logs gzip-compressed (.xes.gz).
+    --per_case              Consider only transitions within a case for the footprint matrix.
+    --jobs JOBS             The number of tracks processed in parallel [default: 1].
+    --cache_dir CACHE_DIR   Reuse the logs of unchanged tracks stored in this cache directory.
+    --cache_size SIZE       The size limit of the cache in megabytes [default: 1024].
+    --profile               Record the time and events of each stage and write them to profile.json in the output directory.
+    --profile_memory        Like --profile, additionally record the peak memory (slows down processing).
+    --formats FORMATS       Comma separated outputs written for each track, any of csv, xes, footprint, npz and counts [default: csv,xes,footprint].
+                            counts stores the directly-follows counts of a track to be summed up by aggregate.py.
+    --merge                 Additionally write song_log files with the events of all tracks merged by case and time, each one
+                            tagged with its track and instrument, and the combined footprint matrix of the song.
+    --chords                Fold the notes of a chord into one event named after the chord, e.g. Em or C7/E for an inversion.
+    --sonorities            Additionally write sonority_log files slicing the song at every start and end of a note. Each slice
+                            has an event per track with its notes or a pause while other tracks sound, and an event of
+                            the chord of all tracks together (track -1). The track logs stay as they are, the pauses
+                            aligned across the tracks and the sonorities are only written to the sonority_log files.
+    --split_channels        Write separate logs track_<i>_channel_<n> for the notes of each MIDI channel of a track, e.g. for
+                            type 0 files or tracks playing several instruments.
 
 Copyright:
     (c) by K-u-K (imperial Keller Patrick & royal Kocaj Alen) 2020
 """
 from docopt import docopt
 from schema import Schema, And, Use, Or, SchemaError
-import mido
 
+import cache
+import chords
 import constants
 import footprint
+import intervals
+import merge
+import midi
+import processor
+import profiling
+import store
+import timing
 import utils
 import xes
 
+import concurrent.futures
+import contextlib
+import functools
+import io
 import os
 import sys
-import datetime
 
 # TODO: code documentation
 # TODO: create man page <3
-# TODO: chord & interval names instead of an own entry for each note in a chord
 # TODO: consider special rhythm structures, quintuplets, septuplets, etc.
 # TODO: make timestamp column more accurate
 # TODO: make calculation of note_type more precise and powerful
 # TODO: 
 # TODO: put fixed strings into constants + refactor code (a lot). Convert to Class instead of main py
-# TODO: fill up missing chords with pauses in other tracks
 # TODO: consider notes whose duration spans more than one measure (whole note starting at 2/4 to 2/4 of new measure)
 #       how should it be implemented in the log 
 
-def main(args):
-    filename    = args["MIDI_FILE"]
-    measures    = args["--measures"]
-    output_dir  = args["--output_dir"]
-    tracks      = args["--tracks"]
+def get_granularity_dir(output_dir, measures, granularities):
+    # a single granularity keeps the flat layout, several ones get a sub directory each
+    if len(granularities) == 1:
+        return output_dir
 
-    if output_dir is None:
-        output_dir = os.path.splitext(filename)[0].lower()
+    return os.path.join(output_dir, f"measures_{measures}")
+
+def write_footprint(counts, output_dir, i):
+    footprint_matrix = footprint.calculate_footprint_symbols(counts)
+    footprint_path   = f"{output_dir}/track_{i}_footprint_matrix.txt"
+    with open(footprint_path, "w") as fh:
+        fh.write(footprint_matrix.to_string())
 
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
-    mid = mido.MidiFile(filename, clip=True)
-    if tracks[0] == -1:
-        tracks = [*range(len(mid.tracks))]
-
-    if max(tracks) >= len(mid.tracks):
-        print("Highest tracks does not exist in MIDI file")
-        sys.exit(1) 
-
-    if measures == 0:
-        measures = sys.maxsize
-
-    for i in tracks:
-        track = mid.tracks[i]
-        if __debug__:
-            print(f"Processing track {i} '{track.name}'")
-
-        state   = {}
-        results = []
-
-        default = lambda: {"key": "", "msg": None}
-
-        # prev_note_on keeps track is important when a given note_on event is part of a chord
-        prev_note_on  = default()
-
-        # prev_note_off keeps track is important when a given note_off event has a time of zero
-        #               indicating that a different note_off event happened between the note_on & note_off event
-        #               of the actual note
-        prev_note_off = default()
-        chord         = default()
-
-        order       = 1
-        case_number = 1    
-        ticks       = 0
-        is_first    = True
-
-        # define start datetime, assume default tempo is 500000us
-        now   = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        tempo = 500000
-
-        # assume default time signature is 4/4
-        # threshold defines the number of ticks for each case
-        threshold = utils.get_default_time_signature_ticks(mid.ticks_per_beat, measures)
-
-        # analyse meta tracks in terms of time_signature / set_tempo
-        if all([msg.is_meta or msg.type not in constants.NOTE_EVENTS for msg in track]):
-            time_signatures = [*filter(lambda msg: msg.type == constants.META_TIME_SIGNATUR, track)]
-            set_tempos      = [*filter(lambda msg: msg.type == constants.META_SET_TEMPO, track)]
-
-            # multiple time_signatures and set_tempo events in a meta track are uncommon but technically possible (take the last ticks)
-            for time_signature in time_signatures:
-                threshold = utils.get_time_signature_ticks(time_signature, mid.ticks_per_beat, measures)
-            for set_tempo in set_tempos:
-                tempo = set_tempo.tempo
-
-            continue
-
-        # process main tracks
-        for msg in track:
-            if msg.type == constants.META_TIME_SIGNATUR:
-                threshold = utils.get_time_signature_ticks(msg, mid.ticks_per_beat, measures)
-
-            if msg.type == constants.META_SET_TEMPO:
-                tempo = msg.tempo
-
-            if msg.type not in constants.NOTE_EVENTS:
-                continue
-
-            if __debug__:
-                print(f"Message type={msg.type} note={utils.get_key(msg.note)} ({msg.note}) velocity={msg.velocity} time={msg.time}")
-
-            # prepend pauses
-            if msg.type == constants.NOTE_ON and msg.time != 0 and msg.velocity != 0:
-                note_types = utils.get_note_type_pause(msg.time, mid.ticks_per_beat)
-                
-                # ignore invalid pauses (MuseScore defines strange note_on message with sufficiently low ticks) 
-                if constants.UNKNOWN_NOTE_TYPE not in note_types:
-                    note_types = utils.order_note_types(note_types, ticks, mid.ticks_per_beat, threshold)
-
-                    for note_type in note_types:
-                        if "triplet" in note_type:
-                            continue
-
-                        msg.time = mid.ticks_per_beat * (constants.NOTE_TYPES[note_type][0] + constants.NOTE_TYPES[note_type][1]) / 2 
-                        
-                        #for _ in range(times):
-                        if len(results) > 0:                        
-                            now = now + datetime.timedelta(microseconds=int(1e6 * mido.tick2second(msg.time, mid.ticks_per_beat, tempo)))
-
-                        results.append({
-                            "case":     case_number,
-                            "key":      "Pause",
-                            "type":     note_type,
-                            "order":    order,
-                            "is_chord": False,
-                            "time":     utils.adapt_iso_time(now)
-                        })
-                        order = order + 1
-                        ticks = ticks + msg.time
-                        if threshold <= ticks:
-                            case_number = case_number + 1
-                            ticks       = ticks % threshold
-
-                    msg.time = 0    
-
-            # if summed up ticks reach the threshold increment case number
-            # => e.g. if one bar is the timespan for a case increase case number after each bar
-            ticks = ticks + msg.time
-            if threshold <= ticks:
-                case_number = case_number + 1
-                ticks       = ticks % threshold
-
-            if msg.velocity == 0 or msg.type == constants.NOTE_OFF:
-                key         = utils.get_key(msg.note)
-                time        = msg.time
-                update_now  = False
-
-                if state[key]["is_chord"]:
-                    if time == 0:
-                        time = chord["msg"].time
-                    else: 
-                        chord = {
-                            "key": key,
-                            "msg": msg
-                        }
-                        update_now = True
-                else:
-                    if time == 0:
-                        time = prev_note_off["msg"].time
-                    else:
-                        update_now = True
-                
-                times, note_type = utils.get_note_type(time, mid.ticks_per_beat)
-
-                # hack: if triplet is found, it is assumed that the full length of a triplet
-                # is seperated in one note_off and the next note_one message (behaviour was observed in MuseScore)
-                # therefore, each triplet is leveled up and the case_number is adapted accordingly
-                if (times == 1 and "triplet" in note_type):
-                    core_note_type = note_type.split("triplet ")[-1]
-                    note_type = f"triplet {utils.get_note_before(core_note_type)}"
-
-                    ticks = ticks + msg.time
-                    if threshold <= ticks:
-                        case_number        = case_number + 1
-                        ticks              = ticks % threshold
-
-                state[key]["type"] = (f"{times} " if times > 1 else "") + note_type
-
-                if update_now and len(results) > 0 and note_type != constants.UNKNOWN_NOTE_TYPE:
-                    t   = mid.ticks_per_beat * times * ((constants.NOTE_TYPES[note_type][0] + constants.NOTE_TYPES[note_type][1]) / 2)
-                    now = now + datetime.timedelta(microseconds=int(1e6 * mido.tick2second(t, mid.ticks_per_beat, tempo)))
-
-                state[key]["time"] = utils.adapt_iso_time(now) 
-                results.append(state[key])
-
-                prev_note_on  = default()
-                prev_note_off = {
-                    "key": key,
-                    "msg": msg
-                }
-
-                del state[key]
-                continue
-
-            is_chord = False
-            if prev_note_on["msg"] is not None and prev_note_on["msg"].type == constants.NOTE_ON and msg.time == 0 and not is_first:
-                is_chord = True
-                state[prev_note_on["key"]]["is_chord"] = True
-                order = order - 1
-
-            key = utils.get_key(msg.note)
-            state[key] = {
-                "case":     case_number,
-                "key":      key,
-                "type":     "",
-                "order":    order,
-                "is_chord": is_chord,
-                "time":     ""
-            }
-
-            prev_note_on = {
-                "key": key,
-                "msg": msg
-            }
-            order    = order + 1
-            is_first = False
+    if __debug__:
+        print(footprint_matrix)
 
+def write_logs(table, output_dir, i, meta, compress, per_case, formats=constants.DEFAULT_FORMATS):
+    if constants.FORMAT_CSV in formats:
         output = f"{output_dir}/track_{i}.csv"
-        with open(output, "w") as fh:
+        with profiling.stage("csv", len(table)), open(output, "w") as fh:
             fh.write("Case_ID;Event;Type;Order;Is_Chord;Timestamp\n")
-            for result in results:
-                fh.write("{};{};{};{};{};{}\n".format(
-                    result["case"],
-                    result["key"],
-                    result["type"],
-                    result["order"],
-                    result["is_chord"],
-                    result["time"]
-                ))
-        
-        # export to XES
-        xes.export_to_xes(output)
-
-        # generate and store footprint matrix
-        footprint_matrix = footprint.calculate_footprint_matrix(output)
-        footprint_path   = f"{output_dir}/track_{i}_footprint_matrix.txt"
-        with open(footprint_path, "w") as fh:
-            fh.write(footprint_matrix.to_string())
-
-        if __debug__:
-            print(footprint_matrix)
-
-    print(f"Midi file '{filename}' processed. Track logfiles and event streams generated in directory '{output_dir}'")
+            table.write_csv(fh, meta["start"])
+
+    # export to XES
+    if constants.FORMAT_XES in formats:
+        with profiling.stage("xes", len(table)):
+            xes.export_to_xes(table, f"{output_dir}/track_{i}.xes", meta["start"], compress)
+
+    # generate and store footprint matrix
+    if constants.FORMAT_FOOTPRINT in formats:
+        with profiling.stage("footprint", len(table)):
+            write_footprint(footprint.calculate_transition_counts(table, per_case), output_dir, i)
+
+    # the columns of the event table, to be loaded again without parsing any text
+    if constants.FORMAT_NPZ in formats:
+        table.save(f"{output_dir}/track_{i}.npz")
+
+    if constants.FORMAT_COUNTS in formats:
+        with profiling.stage("counts", len(table)):
+            footprint.save_counts(footprint.create_counts(table, per_case), f"{output_dir}/track_{i}_counts.npz")
+
+def write_granularities(table, name, meta, granularities, output_dir, compress, per_case, formats=constants.DEFAULT_FORMATS):
+    # table holds the cases of the first granularity. the case ids of every other one are a lookup
+    # of the bar numbers, so all logs come from the same pass
+    for measures in granularities:
+        cases = table if measures == granularities[0] else table.with_cases(timing.get_cases(table.bar, measures))
+        write_logs(cases, get_granularity_dir(output_dir, measures, granularities), name, meta, compress, per_case, formats)
+
+def process_voice(name, messages, meta, granularities, output_dir, compress, per_case, formats, fold_chords, tempo_map, bar_index, keep_table=False):
+    # the logs of the note messages of a whole track or of one of its channels. returns the number
+    # of events, None for messages without any note, and with keep_table the event table of the first granularity
+    track_processor = processor.TrackProcessor(meta["ticks_per_beat"], tempo_map, bar_index, granularities[0])
+    if track_processor.classify(messages) == 0:
+        return None, None
+
+    started = profiling.begin()
+    events  = track_processor.process(messages)
+    if fold_chords:
+        events = chords.fold_chords(events)
+
+    table = store.EventTable.from_events(events)
+    profiling.end("message_loop", started, len(table))
+
+    write_granularities(table, name, meta, granularities, output_dir, compress, per_case, formats)
+
+    return len(table), table if keep_table else None
+
+def keep_song_data(result, messages, table, keep_table, keep_intervals):
+    # the name of the track with its events and notes, for the song logs written once all tracks are done
+    if keep_table or keep_intervals:
+        result["name"] = midi.get_track_name(messages)
+    if keep_table:
+        result["table"] = table
+    if keep_intervals:
+        result["intervals"] = intervals.read_track_intervals(messages)
+
+    return result
+
+def process_track(i, track, meta, granularities, output_dir, compress, per_case, result_cache=None, formats=constants.DEFAULT_FORMATS, fold_chords=False, split_channels=False, keep_table=False, keep_intervals=False):
+    # with keep_table the result holds the event table of the first granularity, with keep_intervals the
+    # note intervals of the track
+    if __debug__:
+        print(f"Processing track {i} '{track.name}'")
+
+    # unchanged tracks are restored from the cache instead of being processed again. the channels
+    # of a split track are only known once it is decoded, so they are not cached
+    if split_channels:
+        result_cache = None
+
+    if result_cache is not None:
+        cache_key = cache.get_track_key(track.raw(), meta, granularities, compress, per_case, formats, fold_chords)
+        restored  = result_cache.restore(cache_key, output_dir, i, granularities, compress, formats)
+
+        # a track cached without its event table is processed again when the table is needed
+        if restored is not None and (restored[1] is not None or not keep_table):
+            # the timestamped logs are written anew with the start date of this run
+            events, table = restored
+            if table is not None:
+                timestamped = [output_format for output_format in formats if output_format in cache.TIMESTAMPED_FORMATS]
+                write_granularities(table, i, meta, granularities, output_dir, compress, per_case, timestamped)
+
+            messages = [*track] if keep_intervals else track
+            return keep_song_data({"events": events, "cache": "hit"}, messages, table, keep_table, keep_intervals)
+
+    # the track is decoded once, every further pass reads the decoded messages
+    messages = [*track]
+
+    # asynchronous tracks carry their own tempo map and bar lines
+    tempo_map = meta["tempo_map"]
+    bar_index = meta["bar_index"]
+    if tempo_map is None:
+        tempo_map = timing.TempoMap.from_track(messages, meta["ticks_per_beat"])
+        bar_index = timing.BarIndex.from_track(messages, meta["ticks_per_beat"])
+
+    if not split_channels:
+        cache_table   = result_cache is not None and any(output_format in cache.TIMESTAMPED_FORMATS for output_format in formats)
+        events, table = process_voice(i, messages, meta, granularities, output_dir, compress, per_case, formats, fold_chords, tempo_map, bar_index, keep_table or cache_table)
+
+        # skip meta tracks, they contain no note events at all
+        if events is None:
+            return None
+
+        result = {"events": events, "cache": None}
+        if result_cache is not None:
+            result_cache.store(cache_key, output_dir, i, granularities, compress, events, formats, table)
+            result["cache"] = "miss"
+
+        return keep_song_data(result, messages, table, keep_table, keep_intervals)
+
+    # the channels of the track are logged as track_<i>_channel_<n> side by side
+    channels = processor.split_channels(messages)
+    if len(channels) == 0:
+        return None
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(channels)) as executor:
+        futures = {channel: executor.submit(process_voice, f"{i}_channel_{channel}", messages, meta, granularities, output_dir,
+                                            compress, per_case, formats, fold_chords, tempo_map, bar_index) for channel, messages in channels.items()}
+        events  = {channel: future.result()[0] for channel, future in futures.items()}
+
+    # the song log holds the events of the whole track
+    table = None
+    if keep_table:
+        track_events = processor.iter_track_events(messages, meta["ticks_per_beat"], tempo_map, bar_index, granularities[0])
+        if fold_chords:
+            track_events = chords.fold_chords(track_events)
+        table = store.EventTable.from_events(track_events)
+
+    return keep_song_data({"events": sum(events.values()), "cache": None, "channels": events}, messages, table, keep_table, keep_intervals)
+
+def process_track_captured(profile, profile_memory, *args):
+    # run in a worker process, the console output and the profile are handed back in track order
+    with io.StringIO() as buffer, contextlib.redirect_stdout(buffer):
+        if profile:
+            profiling.start(profile_memory)
+
+        result = process_track(*args)
+        return buffer.getvalue(), result, profiling.stop()
+
+def process_file(filename, output_dir=None, measures=1, tracks=None, compress=False, per_case=False, jobs=1, cache_dir=None, cache_size=1024, profile=False, profile_memory=False, formats=constants.DEFAULT_FORMATS, merge_tracks=False, fold_chords=False, sonorities=False, split_channels=False):
+    if profile:
+        profiling.start(profile_memory)
+
+    if output_dir is None:
+        output_dir = os.path.splitext(filename)[0].lower()
+
+    # measures is either a single granularity or a list of them, each one gets its own logs
+    granularities = measures if isinstance(measures, list) else [measures]
+    for granularity in granularities:
+        granularity_dir = get_granularity_dir(output_dir, granularity, granularities)
+        if not os.path.exists(granularity_dir):
+            os.makedirs(granularity_dir)
+
+    # only the selected tracks and the conductor track are decoded, lazily while they are processed
+    started = profiling.begin()
+    reader  = midi.MidiReader(filename, clip=True)
+    if tracks is None or tracks[0] == -1:
+        tracks = [*range(len(reader.tracks))]
+
+    if max(tracks) >= len(reader.tracks):
+        raise utils.ProcessMusicError("Highest tracks does not exist in MIDI file")
+
+    # meta tracks are analysed once up front and handed to every track
+    meta   = processor.analyse_meta_tracks(reader)
+    tracks = [i for i in tracks if i not in meta["meta_tracks"]]
+    profiling.end("load", started)
+
+    result_cache = None
+    if cache_dir is not None:
+        result_cache = cache.ResultCache(cache_dir, cache_size * 1024 * 1024)
+
+    work    = [(i, reader.tracks[i], meta, granularities, output_dir, compress, per_case, result_cache, formats, fold_chords, split_channels, merge_tracks, sonorities) for i in tracks]
+    results = []
+    if jobs > 1 and len(tracks) > 1:
+        worker = functools.partial(process_track_captured, profile, profile_memory)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(tracks))) as executor:
+            for output, result, report in executor.map(worker, *zip(*work)):
+                print(output, end="")
+                profiling.add(report)
+                results.append(result)
+    else:
+        for job in work:
+            results.append(process_track(*job))
+
+    # drop the selected tracks which turned out to be meta tracks
+    results = {i: result for i, result in zip(tracks, results) if result is not None}
+
+    # the song log merges the event tables the tracks were logged with, ordered by case and time
+    output_dirs = {granularity: get_granularity_dir(output_dir, granularity, granularities) for granularity in granularities}
+    song_events = None
+    if merge_tracks and len(results) > 0:
+        tables      = {i: result["table"] for i, result in results.items()}
+        instruments = {i: result["name"] for i, result in results.items()}
+        song_events = merge.write_song_log(tables, instruments, meta, output_dirs, compress, per_case, formats)
+
+    # the notes of all tracks are aligned with an interval index, which is queried at every note boundary
+    sonority_events = None
+    if sonorities and len(results) > 0:
+        index           = intervals.IntervalIndex.from_tracks({i: result["intervals"] for i, result in results.items()})
+        instruments     = {i: result["name"] for i, result in results.items()}
+        sonority_events = intervals.write_sonority_log(index, instruments, meta, output_dirs, compress, per_case, formats)
+
+    summary = {
+        "filename":        filename,
+        "output_dir":      output_dir,
+        "events":          {i: result["events"] for i, result in results.items()},
+        "song_events":     song_events,
+        "sonority_events": sonority_events,
+        "cache": {
+            "hits":   sum(1 for result in results.values() if result["cache"] == "hit"),
+            "misses": sum(1 for result in results.values() if result["cache"] == "miss")
+        },
+        "profile":         profiling.stop()
+    }
+
+    if summary["profile"] is not None:
+        summary["profile"]["filename"] = filename
+        profiling.write_report(summary["profile"], os.path.join(output_dir, "profile.json"))
+
+    return summary
+
+def main(args):
+    filename = args["MIDI_FILE"]
+
+    try:
+        summary = process_file(
+            filename,
+            output_dir     = args["--output_dir"],
+            measures       = args["--measures"],
+            tracks         = args["--tracks"],
+            compress       = args["--gzip"],
+            per_case       = args["--per_case"],
+            jobs           = args["--jobs"],
+            cache_dir      = args["--cache_dir"],
+            cache_size     = args["--cache_size"],
+            profile        = args["--profile"] or args["--profile_memory"],
+            profile_memory = args["--profile_memory"],
+            formats        = args["--formats"],
+            merge_tracks   = args["--merge"],
+            fold_chords    = args["--chords"],
+            sonorities     = args["--sonorities"],
+            split_channels = args["--split_channels"])
+    except utils.ProcessMusicError as e:
+        print(e)
+        sys.exit(1)
+
+    if args["--cache_dir"] is not None:
+        print(f"Cache: {summary['cache']['hits']} hits, {summary['cache']['misses']} misses")
+
+    if summary["profile"] is not None:
+        print(f"Profile written to '{os.path.join(summary['output_dir'], 'profile.json')}'")
+
+    print(f"Midi file '{filename}' processed. Track logfiles and event streams generated in directory '{summary['output_dir']}'")
 
 if __name__ == '__main__':
-    args   = docopt(__doc__, version="0.2.0")
+    args   = docopt(__doc__, version=constants.VERSION)
     schema = Schema({
         "MIDI_FILE":  And(os.path.exists, error="MIDI_FILE should exist"),
-        "--measures": And(Use(int), lambda x: int(x) >= 0 , error="Measure should be a positive non-zero number"),
+        "--measures": And(Use(utils.parse_measures), lambda x: all(m >= 0 for m in x), error="Measures should be a comma separated list of positive numbers"),
         "--tracks": And(Use(
             lambda x: [*map(lambda a: int(a), x)]), 
             lambda x: (len(x) == 1 and -1 in x) or (sum(x) >= -1 and -1 not in x), 
             error="Tracks to examine should be a list of positive numbers or all by using -1"),
         "--output_dir": Or(None, str),
+        "--gzip": bool,
+        "--per_case": bool,
+        "--jobs": And(Use(int), lambda x: x >= 1, error="Jobs should be a positive non-zero number"),
+        "--cache_dir": Or(None, str),
+        "--cache_size": And(Use(int), lambda x: x > 0, error="Cache size should be a positive non-zero number"),
+        "--profile": bool,
+        "--profile_memory": bool,
+        "--formats": And(Use(utils.parse_formats), lambda x: len(x) > 0 and all(f in constants.FORMATS for f in x), error="Formats should be a comma separated list of csv, xes, footprint, npz and counts"),
+        "--merge": bool,
+        "--chords": bool,
+        "--sonorities": bool,
+        "--split_channels": bool,
         "--version": bool,
         "--help": bool
     })
@@ -288,4 +376,4 @@ if __name__ == '__main__':
         print(__doc__)
         sys.exit(1)
 
-    main(args)
\ No newline at end of file
+    main(args)
\ No newline at end of file
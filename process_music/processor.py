@@ -0,0 +1,351 @@
+import constants
+import midi
+import profiling
+import timing
+import utils
+
+from collections import namedtuple
+
+import datetime
+
+# a single event of a track log. time is given in microseconds since the start of the song,
+# bar is the zero based bar the event starts in and case the case of the processor's granularity
+Event = namedtuple("Event", ["case", "key", "type", "order", "is_chord", "time", "bar"])
+
+def analyse_meta_tracks(reader):
+    # the tempo map starts with the default tempo of 500000us, the bar index with the default time signature 4/4
+    meta = {
+        "ticks_per_beat": reader.ticks_per_beat,
+        "tempo_map":      None,
+        "bar_index":      None,
+        "start":          datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0),
+        "meta_tracks":    []
+    }
+
+    # the first track of single and synchronous multi track files is the conductor track. its set_tempo
+    # and time_signature events make up the tempo map and the bar lines of all tracks. independent tracks
+    # of asynchronous files carry their own
+    if reader.type == 2 or len(reader.tracks) == 0:
+        return meta
+
+    # a conductor track with notes of its own, e.g. of single track files, is logged as well and stays decoded
+    track = reader.tracks[0].decode()
+    meta["tempo_map"] = timing.TempoMap.from_track(track, reader.ticks_per_beat)
+    meta["bar_index"] = timing.BarIndex.from_track(track, reader.ticks_per_beat)
+
+    if all([msg.is_meta or msg.type not in constants.NOTE_EVENTS for msg in track]):
+        meta["meta_tracks"].append(0)
+
+    return meta
+
+class TrackProcessor:
+    # the state machine turning the note messages of a track into log events. messages are pushed
+    # with feed, which hands back the events completed by the message, or pulled through process
+    def __init__(self, ticks_per_beat, tempo_map=None, bar_index=None, measures=1):
+        self.ticks_per_beat = ticks_per_beat
+        self.tempo_map      = tempo_map if tempo_map is not None else timing.TempoMap(ticks_per_beat)
+        self.bar_index      = bar_index if bar_index is not None else timing.BarIndex(ticks_per_beat)
+        self.measures       = measures
+
+        # classified durations of note_off messages and pauses, filled in batches by classify
+        # or one by one for durations showing up only while streaming
+        self.note_types  = {}
+        self.pause_types = {}
+        self.note_labels = {}
+
+        # position is the time of the log in ticks, clock counts the ticks of the track for the bar lines
+        self.position = 0
+        self.clock    = 0
+        self.events   = 0
+
+        # the sounding notes, one slot per MIDI note number. a note struck again before its note_off
+        # waits in the overlaps of its pitch and moves into the slot once the earlier one is released
+        self.active   = [False] * 128
+        self.orders   = [0] * 128
+        self.chords   = [False] * 128
+        self.ticks    = [0] * 128
+        self.overlaps = [[] for _ in range(128)]
+
+        # prev_note_on keeps track is important when a given note_on event is part of a chord
+        self.prev_note_on = None
+
+        # prev_note_off keeps track is important when a given note_off event has a time of zero
+        #               indicating that a different note_off event happened between the note_on & note_off event
+        #               of the actual note
+        self.prev_note_off = 0
+        self.chord         = 0
+
+        self.order    = 1
+        self.is_first = True
+
+    def classify(self, messages):
+        # classify the durations of all note events and pauses in one batch up front.
+        # returns the number of note events, zero means the messages belong to a meta track
+        started   = profiling.begin()
+        durations = set()
+        pauses    = set()
+        notes     = 0
+        for msg in messages:
+            if msg.type not in constants.NOTE_EVENTS:
+                continue
+
+            notes = notes + 1
+            if msg.type == constants.NOTE_OFF or msg.velocity == 0:
+                durations.add(msg.time)
+            elif msg.time != 0:
+                pauses.add(msg.time)
+
+        profiling.end("load", started)
+
+        durations = [duration for duration in durations if duration not in self.note_types]
+        pauses    = [pause for pause in pauses if pause not in self.pause_types]
+
+        with profiling.stage("classification", len(durations) + len(pauses)):
+            self.note_types.update(zip(durations, utils.get_note_types(durations, self.ticks_per_beat)))
+            self.pause_types.update(zip(pauses, utils.get_note_types_pause(pauses, self.ticks_per_beat)))
+
+        return notes
+
+    def get_note_type(self, ticks):
+        if ticks not in self.note_types:
+            self.note_types[ticks] = utils.get_note_type(ticks, self.ticks_per_beat)
+        return self.note_types[ticks]
+
+    def get_pause_types(self, ticks):
+        if ticks not in self.pause_types:
+            self.pause_types[ticks] = utils.get_note_type_pause(ticks, self.ticks_per_beat)
+        return self.pause_types[ticks]
+
+    def get_note_label(self, ticks):
+        # the type label, the length in ticks (None for unknown note types) and whether the triplet
+        # hack applies, worked out once per distinct note_off duration
+        if ticks not in self.note_labels:
+            times, note_type = self.get_note_type(ticks)
+
+            # hack: if triplet is found, it is assumed that the full length of a triplet
+            # is seperated in one note_off and the next note_one message (behaviour was observed in MuseScore)
+            # therefore, each triplet is leveled up and the clock is adapted accordingly
+            levelled = times == 1 and "triplet" in note_type
+            if levelled:
+                core_note_type = note_type.split("triplet ")[-1]
+                note_type = f"triplet {utils.get_note_before(core_note_type)}"
+
+            length = None
+            if note_type != constants.UNKNOWN_NOTE_TYPE:
+                length = self.ticks_per_beat * times * ((constants.NOTE_TYPES[note_type][0] + constants.NOTE_TYPES[note_type][1]) / 2)
+
+            self.note_labels[ticks] = ((f"{times} " if times > 1 else "") + note_type, length, levelled)
+        return self.note_labels[ticks]
+
+    def create_event(self, key, note_type, order, is_chord, time, clock):
+        # convert the tick positions of a finished note or pause to its timestamp and bar
+        bar = self.bar_index.get_bar(clock)
+        return Event(
+            case     = timing.get_case(bar, self.measures),
+            key      = key,
+            type     = note_type,
+            order    = order,
+            is_chord = is_chord,
+            time     = self.tempo_map.get_microseconds(time),
+            bar      = bar
+        )
+
+    def get_open_case(self):
+        # the lowest case an event still to come can belong to. notes are logged at their note_off in the case of
+        # their note_on, so the case of the earliest sounding note stays open, as well as the case of the clock
+        ticks = min([self.clock] + [self.ticks[note] for note in range(128) if self.active[note]])
+        for overlaps in self.overlaps:
+            if len(overlaps) > 0:
+                ticks = min(ticks, overlaps[0][2])
+
+        return timing.get_case(self.bar_index.get_bar(ticks), self.measures)
+
+    def feed(self, msg):
+        if msg.type not in constants.NOTE_EVENTS:
+            return []
+
+        if __debug__:
+            print(f"Message type={msg.type} note={utils.KEYS[msg.note]} ({msg.note}) velocity={msg.velocity} time={msg.time}")
+
+        events         = []
+        ticks_per_beat = self.ticks_per_beat
+        delta          = msg.time
+
+        # prepend pauses
+        if msg.type == constants.NOTE_ON and delta != 0 and msg.velocity != 0:
+            pause_note_types = self.get_pause_types(delta)
+            if pause_note_types is None:
+                raise utils.ProcessMusicError(f"could not determine note type of pause for ticks {delta}")
+
+            # ignore invalid pauses (MuseScore defines strange note_on message with sufficiently low ticks)
+            if constants.UNKNOWN_NOTE_TYPE not in pause_note_types:
+                ticks, threshold = self.bar_index.get_offset(self.clock)
+                pause_note_types = utils.order_note_types(pause_note_types, ticks, ticks_per_beat, threshold)
+
+                for note_type in pause_note_types:
+                    if "triplet" in note_type:
+                        continue
+
+                    length = ticks_per_beat * (constants.NOTE_TYPES[note_type][0] + constants.NOTE_TYPES[note_type][1]) / 2
+
+                    if self.events > 0:
+                        self.position = self.position + length
+
+                    events.append(self.create_event(constants.PAUSE, note_type, self.order, False, self.position, self.clock))
+                    self.events = self.events + 1
+                    self.order  = self.order + 1
+                    self.clock  = self.clock + length
+
+                # the pause is consumed, the note itself starts right after it
+                delta = 0
+            else:
+                profiling.count("unknown_pause_types")
+
+        # the bar of an event is looked up from the summed up ticks
+        # => e.g. if one bar is the timespan for a case the case number increases after each bar line
+        self.clock = self.clock + delta
+
+        note = msg.note
+        if msg.velocity == 0 or msg.type == constants.NOTE_OFF:
+            # a note_off without a sounding note has nothing to finish
+            if not self.active[note]:
+                profiling.count("unmatched_note_offs")
+                return events
+
+            time       = delta
+            update_now = False
+
+            if self.chords[note]:
+                if time == 0:
+                    time = self.chord
+                else:
+                    self.chord = delta
+                    update_now = True
+            else:
+                if time == 0:
+                    time = self.prev_note_off
+                else:
+                    update_now = True
+
+            note_type, length, levelled = self.get_note_label(time)
+            if length is None:
+                profiling.count("unknown_note_types")
+
+            if levelled:
+                self.clock = self.clock + delta
+
+            if update_now and self.events > 0 and length is not None:
+                self.position = self.position + length
+
+            events.append(self.create_event(utils.KEYS[note], note_type, self.orders[note], self.chords[note], self.position, self.ticks[note]))
+            self.events = self.events + 1
+
+            self.prev_note_on  = None
+            self.prev_note_off = delta
+
+            # release the slot, the next overlapping note of the same pitch moves in
+            overlaps = self.overlaps[note]
+            if len(overlaps) > 0:
+                self.orders[note], self.chords[note], self.ticks[note] = overlaps.pop(0)
+            else:
+                self.active[note] = False
+
+            return events
+
+        is_chord     = False
+        prev_note_on = self.prev_note_on
+        if prev_note_on is not None and delta == 0 and not self.is_first:
+            is_chord = True
+            self.order = self.order - 1
+
+            # the previous note is the latest one struck of its pitch
+            overlaps = self.overlaps[prev_note_on]
+            if len(overlaps) > 0:
+                overlaps[-1] = (overlaps[-1][0], True, overlaps[-1][2])
+            else:
+                self.chords[prev_note_on] = True
+
+        if self.active[note]:
+            self.overlaps[note].append((self.order, is_chord, self.clock))
+        else:
+            self.active[note] = True
+            self.orders[note] = self.order
+            self.chords[note] = is_chord
+            self.ticks[note]  = self.clock
+
+        self.prev_note_on = note
+        self.order        = self.order + 1
+        self.is_first     = False
+
+        return events
+
+    def flush(self):
+        # notes without a note_off message at the end of the track are dropped, as they have no length
+        self.active       = [False] * 128
+        self.overlaps     = [[] for _ in range(128)]
+        self.prev_note_on = None
+        return []
+
+    def trim(self, size):
+        # drop the classified durations once there are more than size of them, so a processor fed
+        # for an arbitrarily long time keeps its memory. they are classified again when showing up
+        if len(self.note_types) + len(self.pause_types) > size:
+            self.note_types  = {}
+            self.pause_types = {}
+            self.note_labels = {}
+
+    def process(self, messages):
+        for msg in messages:
+            yield from self.feed(msg)
+
+        yield from self.flush()
+
+def split_channels(messages):
+    # demultiplex the note messages of a track by channel in a single pass. the time of every message
+    # becomes the ticks since the previous message of its own channel
+    channels = {}
+    ticks    = {}
+    tick     = 0
+    for msg in messages:
+        tick = tick + msg.time
+        if msg.type not in constants.NOTE_EVENTS:
+            continue
+
+        if msg.channel not in channels:
+            channels[msg.channel] = []
+            ticks[msg.channel]    = 0
+
+        channels[msg.channel].append(msg.copy(time=tick - ticks[msg.channel]))
+        ticks[msg.channel] = tick
+
+    return {channel: channels[channel] for channel in sorted(channels)}
+
+def iter_track_events(track, ticks_per_beat, tempo_map=None, bar_index=None, measures=1):
+    # lazily yield the events of a track. tracks which can be iterated more than once, e.g. the tracks
+    # of a midi.MidiReader, get their durations classified in one batch before. a single pass iterator
+    # without a tempo map and bar index of its own is processed with the default tempo and 4/4
+    reiterable = iter(track) is not track
+    if tempo_map is None and reiterable:
+        tempo_map = timing.TempoMap.from_track(track, ticks_per_beat)
+
+    if bar_index is None and reiterable:
+        bar_index = timing.BarIndex.from_track(track, ticks_per_beat)
+
+    processor = TrackProcessor(ticks_per_beat, tempo_map, bar_index, measures)
+    if reiterable:
+        processor.classify(track)
+
+    yield from processor.process(track)
+
+def iter_file_events(filename, measures=1, tracks=None):
+    # yield (track index, lazy event generator) for the selected tracks of a MIDI file, skipping meta tracks
+    reader = midi.MidiReader(filename, clip=True)
+    meta   = analyse_meta_tracks(reader)
+    if tracks is None:
+        tracks = [*range(len(reader.tracks))]
+
+    for i in tracks:
+        if i in meta["meta_tracks"]:
+            continue
+
+        yield i, iter_track_events(reader.tracks[i], meta["ticks_per_beat"], meta["tempo_map"], meta["bar_index"], measures)
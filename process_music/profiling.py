@@ -0,0 +1,148 @@
+import contextlib
+import json
+import threading
+import time
+import tracemalloc
+
+# the profile of the running process. None while profiling is off, so every hook is a single check
+_profile = None
+
+# stages may run in several threads at once, e.g. the channels of a split track
+_lock = threading.Lock()
+
+STAGES = ["load", "classification", "message_loop", "csv", "xes", "footprint", "counts", "merge", "sonorities"]
+
+def create_report():
+    return {
+        "seconds":     0.0,
+        "stages":      {stage: {"seconds": 0.0, "calls": 0, "events": 0} for stage in STAGES},
+        "counters":    {},
+        "peak_memory": None
+    }
+
+def start(memory=False):
+    global _profile
+    _profile = {"report": create_report(), "start": time.perf_counter(), "memory": memory}
+
+    # restart tracing, so the peak of an earlier run is not carried over
+    if memory:
+        tracemalloc.stop()
+        tracemalloc.start()
+
+def stop():
+    # end profiling and hand back the report of everything recorded since start
+    global _profile
+    if _profile is None:
+        return None
+
+    profile  = _profile
+    _profile = None
+
+    report            = profile["report"]
+    report["seconds"] = time.perf_counter() - profile["start"]
+    if profile["memory"] and tracemalloc.is_tracing():
+        report["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return report
+
+def is_active():
+    return _profile is not None
+
+class _NoStage:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_STAGE = _NoStage()
+
+def _get_stage(name):
+    return _profile["report"]["stages"].setdefault(name, {"seconds": 0.0, "calls": 0, "events": 0})
+
+def _record(name, seconds, events):
+    with _lock:
+        stage            = _get_stage(name)
+        stage["seconds"] = stage["seconds"] + seconds
+        stage["calls"]   = stage["calls"] + 1
+        stage["events"]  = stage["events"] + events
+
+@contextlib.contextmanager
+def _measure(name, events):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - start, events)
+
+def stage(name, events=0):
+    # time a stage of the pipeline. while profiling is off a shared no-op context is returned
+    if _profile is None:
+        return _NO_STAGE
+
+    return _measure(name, events)
+
+def begin():
+    # manual counterpart of stage for code blocks too large to be wrapped, None while profiling is off
+    if _profile is None:
+        return None
+
+    return time.perf_counter()
+
+def end(name, started, events=0):
+    if _profile is None or started is None:
+        return
+
+    _record(name, time.perf_counter() - started, events)
+
+def add_events(name, events):
+    # events of a stage which are only known once it is finished
+    if _profile is None:
+        return
+
+    with _lock:
+        stage           = _get_stage(name)
+        stage["events"] = stage["events"] + events
+
+def count(name, value=1):
+    if _profile is None:
+        return
+
+    with _lock:
+        counters       = _profile["report"]["counters"]
+        counters[name] = counters.get(name, 0) + value
+
+def merge(reports):
+    # aggregate the reports of several tracks or files. times and counters add up, peak memory is the highest one
+    total = create_report()
+    for report in reports:
+        if report is None:
+            continue
+
+        total["seconds"] = total["seconds"] + report["seconds"]
+        for name, stage in report["stages"].items():
+            merged = total["stages"].setdefault(name, {"seconds": 0.0, "calls": 0, "events": 0})
+            for key in merged:
+                merged[key] = merged[key] + stage[key]
+
+        for name, value in report["counters"].items():
+            total["counters"][name] = total["counters"].get(name, 0) + value
+
+        if report["peak_memory"] is not None:
+            total["peak_memory"] = max(total["peak_memory"] or 0, report["peak_memory"])
+
+    return total
+
+def add(report):
+    # fold the report of a worker process into the profile of this process
+    if _profile is None or report is None:
+        return
+
+    seconds = _profile["report"]["seconds"]
+    _profile["report"]            = merge([_profile["report"], report])
+    _profile["report"]["seconds"] = seconds
+
+def write_report(report, filename):
+    with open(filename, "w") as fh:
+        json.dump(report, fh, indent=2)
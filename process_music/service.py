@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+
+"""Process Music service. Convert MIDI files on a local HTTP or Unix socket endpoint with a pool of warm workers
+
+Usage:
+    service.py serve [--host HOST] [--port PORT] [--socket SOCKET] [--workers WORKERS] [--queue QUEUE]
+    service.py convert [--host HOST] [--port PORT] [--socket SOCKET] [--measures MEASURES] [--formats FORMATS] [--gzip] [--per_case] [--output_dir OUTPUT_DIR] MIDI_FILE
+    service.py status [--host HOST] [--port PORT] [--socket SOCKET]
+    service.py (-h | --help)
+    service.py (-v | --version)
+
+Options:
+    -h --help               Show help.
+    -v --version            Show version information.
+    --host HOST             The host the service listens on, only local addresses are intended [default: 127.0.0.1].
+    --port PORT             The port the service listens on [default: 8765].
+    --socket SOCKET         Listen on / connect to a Unix socket instead of host and port.
+    --workers WORKERS       The number of warm worker processes, i.e. the number of jobs processed concurrently [default: 2].
+    --queue QUEUE           The number of jobs waiting for a worker before new jobs are rejected [default: 8].
+    --measures MEASURES     The number of measures you want to define for a case. Zero defines everything as trace / case.
+                            Comma separated values write one log per granularity into measures_<value> sub directories [default: 1].
+    --formats FORMATS       Comma separated outputs written for each track, any of csv, xes, footprint, npz and counts [default: csv,xes,footprint].
+    --gzip                  Store the XES logs gzip-compressed (.xes.gz).
+    --per_case              Consider only transitions within a case for the footprint matrix.
+    --output_dir OUTPUT_DIR Let the service write the logs into this directory. By default they are sent back
+                            and stored next to the MIDI file.
+
+Endpoints:
+    POST /convert           MIDI bytes as body. The query parameters measures, formats, gzip, per_case and output_dir
+                            correspond to the options above. Answers a JSON summary with the timing of the job and,
+                            without output_dir, the base64 encoded logs.
+    GET  /status            Answers the number of workers, queued and finished jobs as JSON.
+
+Copyright:
+    (c) by K-u-K (imperial Keller Patrick & royal Kocaj Alen) 2020
+"""
+from docopt import docopt
+from schema import Schema, And, Use, Or, SchemaError
+
+import constants
+import process_music
+import utils
+
+import base64
+import concurrent.futures
+import contextlib
+import http.client
+import http.server
+import io
+import itertools
+import json
+import os
+import shutil
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+MAX_MIDI_SIZE = 64 * 1024 * 1024
+
+class ServiceBusyError(Exception):
+    pass
+
+def run_job(job, midi, options, submitted):
+    # runs in a warm worker. the MIDI bytes are converted by process_file just like on the command line
+    started   = time.time()
+    directory = tempfile.mkdtemp(prefix="process-music-")
+    result    = {
+        "job":            job,
+        "status":         "ok",
+        "error":          None,
+        "events":         {},
+        "output_dir":     options["output_dir"],
+        "files":          {},
+        "queued_seconds": started - submitted,
+        "seconds":        0.0
+    }
+
+    try:
+        filename = os.path.join(directory, "input.mid")
+        with open(filename, "wb") as fh:
+            fh.write(midi)
+
+        output_dir = options["output_dir"] or os.path.join(directory, "output")
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary = process_music.process_file(
+                filename,
+                output_dir = output_dir,
+                measures   = options["measures"],
+                compress   = options["gzip"],
+                per_case   = options["per_case"],
+                formats    = options["formats"])
+
+        result["events"] = summary["events"]
+
+        # without a target directory the logs are sent back to the client
+        if options["output_dir"] is None:
+            for root, _, files in os.walk(output_dir):
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    with open(path, "rb") as fh:
+                        result["files"][os.path.relpath(path, output_dir)] = base64.b64encode(fh.read()).decode("ascii")
+    except utils.ProcessMusicError as e:
+        result["status"] = "error"
+        result["error"]  = str(e)
+    except (OSError, EOFError, ValueError, IndexError) as e:
+        # a malformed file must not take down the worker, it is reported like in the batch mode
+        result["status"] = "error"
+        result["error"]  = f"{type(e).__name__}: {e}"
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    result["seconds"] = time.time() - started
+    return result
+
+def warm_up():
+    # modules imported lazily by the pipeline are imported before the workers are forked
+    import pandas
+
+class Service:
+    # a pool of warm workers behind a bounded queue. a job takes a slot until it is finished,
+    # jobs arriving while all slots are taken are rejected instead of piling up
+    def __init__(self, workers, queue_size):
+        warm_up()
+
+        self.workers  = workers
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        self.slots    = threading.BoundedSemaphore(workers + queue_size)
+        self.jobs     = itertools.count(1)
+        self.lock     = threading.Lock()
+        self.stats    = {"accepted": 0, "rejected": 0, "pending": 0, "done": 0, "failed": 0, "seconds": 0.0}
+
+        # start all workers up front, so the first jobs don't pay for it
+        for future in [self.executor.submit(warm_up) for _ in range(workers)]:
+            future.result()
+
+    def update(self, **changes):
+        with self.lock:
+            for key, value in changes.items():
+                self.stats[key] = self.stats[key] + value
+
+    def convert(self, midi, options):
+        if not self.slots.acquire(blocking=False):
+            self.update(rejected=1)
+            raise ServiceBusyError("all workers are busy and the queue is full")
+
+        try:
+            self.update(accepted=1, pending=1)
+            job    = next(self.jobs)
+            result = self.executor.submit(run_job, job, midi, options, time.time()).result()
+        finally:
+            self.update(pending=-1)
+            self.slots.release()
+
+        self.update(done=1, failed=int(result["status"] != "ok"), seconds=result["seconds"])
+        print(f"Job {job}: {result['status']}, {sum(result['events'].values())} events, queued {result['queued_seconds']:.3f}s, processed {result['seconds']:.3f}s")
+        return result
+
+    def status(self):
+        with self.lock:
+            return dict(self.stats, workers=self.workers, version=constants.VERSION)
+
+    def close(self):
+        self.executor.shutdown()
+
+def parse_options(query):
+    query = urllib.parse.parse_qs(query)
+    get   = lambda key, default: query[key][-1] if key in query else default
+
+    options = {
+        "measures":   utils.parse_measures(get("measures", "1")),
+        "formats":    utils.parse_formats(get("formats", ",".join(constants.DEFAULT_FORMATS))),
+        "gzip":       get("gzip", "0") in ["1", "true"],
+        "per_case":   get("per_case", "0") in ["1", "true"],
+        "output_dir": get("output_dir", None)
+    }
+
+    if any(measures < 0 for measures in options["measures"]):
+        raise ValueError("measures should be a comma separated list of positive numbers")
+
+    if len(options["formats"]) == 0 or any(f not in constants.FORMATS for f in options["formats"]):
+        raise ValueError("formats should be a comma separated list of csv, xes, footprint, npz and counts")
+
+    if options["output_dir"] is not None and not os.path.isabs(options["output_dir"]):
+        raise ValueError("output_dir should be an absolute path")
+
+    return options
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+    server_version = f"ProcessMusic/{constants.VERSION}"
+
+    def send_json(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if urllib.parse.urlsplit(self.path).path != "/status":
+            return self.send_json(404, {"error": "unknown endpoint"})
+
+        self.send_json(200, self.server.service.status())
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != "/convert":
+            return self.send_json(404, {"error": "unknown endpoint"})
+
+        length = int(self.headers.get("Content-Length", 0))
+        if length <= 0 or length > MAX_MIDI_SIZE:
+            return self.send_json(413 if length > 0 else 400, {"error": f"the body should hold a MIDI file of at most {MAX_MIDI_SIZE} bytes"})
+
+        try:
+            options = parse_options(url.query)
+        except ValueError as e:
+            return self.send_json(400, {"error": str(e)})
+
+        midi = self.rfile.read(length)
+        try:
+            result = self.server.service.convert(midi, options)
+        except ServiceBusyError as e:
+            return self.send_json(503, {"error": str(e)})
+
+        self.send_json(200 if result["status"] == "ok" else 422, result)
+
+    def log_message(self, format, *args):
+        if __debug__:
+            super().log_message(format, *args)
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # unix sockets have no peer address, the request handler expects a host and port pair
+        request, _ = super().get_request()
+        return request, ("local", 0)
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+def create_server(service, host, port, path):
+    if path is not None:
+        if os.path.exists(path):
+            os.remove(path)
+        server = ThreadingUnixHTTPServer(path, RequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), RequestHandler)
+
+    server.service = service
+    return server
+
+def request(args, method, url, body=None):
+    if args["--socket"] is not None:
+        connection = UnixHTTPConnection(args["--socket"])
+    else:
+        connection = http.client.HTTPConnection(args["--host"], args["--port"])
+
+    try:
+        connection.request(method, url, body=body)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read().decode())
+    finally:
+        connection.close()
+
+def serve(args):
+    service = Service(args["--workers"], args["--queue"])
+    server  = create_server(service, args["--host"], args["--port"], args["--socket"])
+
+    address = args["--socket"] or f"http://{args['--host']}:{args['--port']}"
+    print(f"Process Music service with {args['--workers']} workers listening on {address}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args["--socket"] is not None and os.path.exists(args["--socket"]):
+            os.remove(args["--socket"])
+
+def convert(args):
+    filename   = args["MIDI_FILE"]
+    output_dir = args["--output_dir"]
+
+    query = {
+        "measures": ",".join(str(measures) for measures in args["--measures"]),
+        "formats":  ",".join(args["--formats"]),
+        "gzip":     int(args["--gzip"]),
+        "per_case": int(args["--per_case"])
+    }
+    if output_dir is not None:
+        query["output_dir"] = os.path.abspath(output_dir)
+
+    with open(filename, "rb") as fh:
+        status, result = request(args, "POST", f"/convert?{urllib.parse.urlencode(query)}", fh.read())
+
+    if status != 200:
+        print(f"Conversion failed ({status}): {result['error']}")
+        sys.exit(1)
+
+    # logs sent back are stored next to the MIDI file like process_music.py does
+    if output_dir is None:
+        output_dir = os.path.splitext(filename)[0].lower()
+        for name, data in result["files"].items():
+            path = os.path.join(output_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as fh:
+                fh.write(base64.b64decode(data))
+
+    print(f"Midi file '{filename}' converted as job {result['job']} in {result['seconds']:.3f}s (queued {result['queued_seconds']:.3f}s). Logs in directory '{output_dir}'")
+
+def status(args):
+    _, result = request(args, "GET", "/status")
+    print(json.dumps(result, indent=2))
+
+def main(args):
+    try:
+        if args["serve"]:
+            serve(args)
+        elif args["convert"]:
+            convert(args)
+        else:
+            status(args)
+    except (ConnectionError, FileNotFoundError) as e:
+        print(f"Service not reachable: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    args   = docopt(__doc__, version=constants.VERSION)
+    schema = Schema({
+        "serve": bool,
+        "convert": bool,
+        "status": bool,
+        "MIDI_FILE": Or(None, And(os.path.exists, error="MIDI_FILE should exist")),
+        "--host": str,
+        "--port": And(Use(int), lambda x: 0 < x < 65536, error="Port should be a valid port number"),
+        "--socket": Or(None, str),
+        "--workers": And(Use(int), lambda x: x >= 1, error="Workers should be a positive non-zero number"),
+        "--queue": And(Use(int), lambda x: x >= 0, error="Queue should be a positive number"),
+        "--measures": And(Use(utils.parse_measures), lambda x: all(m >= 0 for m in x), error="Measures should be a comma separated list of positive numbers"),
+        "--formats": And(Use(utils.parse_formats), lambda x: len(x) > 0 and all(f in constants.FORMATS for f in x), error="Formats should be a comma separated list of csv, xes, footprint, npz and counts"),
+        "--gzip": bool,
+        "--per_case": bool,
+        "--output_dir": Or(None, str),
+        "--version": bool,
+        "--help": bool
+    })
+
+    try:
+        args = schema.validate(args)
+    except SchemaError as e:
+        print("Warning: invalid arguments given", e, "\n")
+        print(__doc__)
+        sys.exit(1)
+
+    main(args)
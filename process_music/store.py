@@ -0,0 +1,132 @@
+import numpy as np
+
+import chords
+import constants
+import processor
+import utils
+
+# the shared dictionary of event keys: the names of all 128 MIDI notes followed by the pause
+KEYS      = utils.KEYS + [constants.PAUSE]
+KEY_CODES = {key: code for code, key in enumerate(KEYS)}
+PAUSE     = KEY_CODES[constants.PAUSE]
+
+# pitch class codes of the footprint engine for every key code, i.e. the pitch without octave
+KEY_PITCHES = np.array([note % 12 for note in range(128)] + [len(constants.PITCHES)], dtype=np.int8)
+
+COLUMNS = ["key", "type", "case", "order", "is_chord", "time", "bar"]
+
+def get_pitches(key, labels):
+    # labels are encoded by their root, labels without one as -1
+    roots = [chords.get_root(label) for label in labels]
+    return np.concatenate([KEY_PITCHES, np.array(roots, dtype=np.int8)])[key]
+
+def load_pitches(filename):
+    # the pitch codes and cases of a saved event table, without loading any of the other columns
+    with np.load(filename, allow_pickle=False) as data:
+        labels = data["labels"].tolist() if "labels" in data else []
+        return get_pitches(data["key"], labels), data["case"]
+
+class EventTable:
+    # the events of a track log as struct of arrays. keys are codes of the shared KEYS dictionary followed by
+    # the table's own labels (chord names), note types codes of the table's own types dictionary, all other
+    # columns plain integer arrays
+    def __init__(self, key, type, case, order, is_chord, time, bar, types, labels=()):
+        self.key      = np.asarray(key, dtype=np.int16)
+        self.type     = np.asarray(type, dtype=np.int16)
+        self.case     = np.asarray(case, dtype=np.int32)
+        self.order    = np.asarray(order, dtype=np.int32)
+        self.is_chord = np.asarray(is_chord, dtype=np.bool_)
+        self.time     = np.asarray(time, dtype=np.int64)
+        self.bar      = np.asarray(bar, dtype=np.int32)
+        self.types    = [*types]
+        self.labels   = [*labels]
+
+    @classmethod
+    def from_events(cls, events):
+        events = [*events]
+        types  = {}
+        labels = {}
+
+        type_codes = [types.setdefault(event.type, len(types)) for event in events]
+        key_codes  = [KEY_CODES[event.key] if event.key in KEY_CODES else labels.setdefault(event.key, len(KEYS) + len(labels)) for event in events]
+
+        return cls(
+            key      = key_codes,
+            type     = type_codes,
+            case     = [event.case for event in events],
+            order    = [event.order for event in events],
+            is_chord = [event.is_chord for event in events],
+            time     = [event.time for event in events],
+            bar      = [-1 if event.bar is None else event.bar for event in events],
+            types    = types,
+            labels   = labels)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename, allow_pickle=False) as data:
+            labels = data["labels"].tolist() if "labels" in data else []
+            return cls(*[data[column] for column in COLUMNS], types=data["types"].tolist(), labels=labels)
+
+    def save(self, filename):
+        # an uncompressed npz archive of the columns and the types dictionary, readable without any text parsing
+        np.savez(filename, **{column: getattr(self, column) for column in COLUMNS}, types=np.array(self.types, dtype=str), labels=np.array(self.labels, dtype=str))
+
+    def with_cases(self, case):
+        # the same events cut into different cases, all other columns are shared
+        table      = EventTable.__new__(EventTable)
+        table.__dict__.update(self.__dict__)
+        table.case = np.asarray(case, dtype=np.int32)
+        return table
+
+    def take(self, index):
+        # the events at the given positions, the dictionaries are shared
+        return EventTable(*[getattr(self, column)[index] for column in COLUMNS], types=self.types, labels=self.labels)
+
+    def group_by_case(self):
+        # every case in one run of events, the cases in the order of their first event and the events of a
+        # case in the order of the table, like the traces of a XES log
+        _, first, inverse = np.unique(self.case, return_index=True, return_inverse=True)
+        ranks = np.argsort(np.argsort(first))
+        return self.take(np.argsort(ranks[inverse], kind="stable"))
+
+    def get_keys(self):
+        return KEYS + self.labels
+
+    def write_csv(self, fh, start):
+        # the rows of a track log CSV, the header is written by the caller
+        keys    = self.get_keys()
+        columns = zip(self.case.tolist(), self.key.tolist(), self.type.tolist(), self.order.tolist(),
+                      self.is_chord.tolist(), self.time.tolist())
+
+        for case, key, note_type, order, is_chord, time in columns:
+            fh.write("{};{};{};{};{};{}\n".format(
+                case,
+                keys[key],
+                self.types[note_type],
+                order,
+                is_chord,
+                utils.format_timestamp(start, time)
+            ))
+
+    def get_pitches(self):
+        return get_pitches(self.key, self.labels)
+
+    def __len__(self):
+        return len(self.key)
+
+    def __iter__(self):
+        # decode the events one by one for consumers of processor.Event
+        keys    = self.get_keys()
+        columns = zip(self.key.tolist(), self.type.tolist(), self.case.tolist(), self.order.tolist(),
+                      self.is_chord.tolist(), self.time.tolist(), self.bar.tolist())
+
+        for key, note_type, case, order, is_chord, time, bar in columns:
+            yield processor.Event(
+                case     = case,
+                key      = keys[key],
+                type     = self.types[note_type],
+                order    = order,
+                is_chord = is_chord,
+                time     = time,
+                bar      = bar
+            )
@@ -0,0 +1,140 @@
+import numpy as np
+
+import bisect
+
+import constants
+import utils
+
+class TempoMap:
+    # sorted tick positions of all tempo changes and the microseconds elapsed until each of them.
+    # the elapsed time is kept multiplied by ticks_per_beat, so it stays integer and does not drift
+    def __init__(self, ticks_per_beat, changes=()):
+        ticks  = [0]
+        tempos = [constants.DEFAULT_TEMPO]
+
+        for tick, tempo in sorted(changes, key=lambda change: change[0]):
+            if tick == ticks[-1]:
+                tempos[-1] = tempo
+            else:
+                ticks.append(tick)
+                tempos.append(tempo)
+
+        self.ticks_per_beat = ticks_per_beat
+        self.ticks          = np.array(ticks, dtype=np.int64)
+        self.tempos         = np.array(tempos, dtype=np.int64)
+        self.elapsed        = np.concatenate(([0], np.cumsum(np.diff(self.ticks) * self.tempos[:-1])))
+
+        # plain lists for the conversion of single events while they are streamed
+        self.tick_list    = self.ticks.tolist()
+        self.tempo_list   = self.tempos.tolist()
+        self.elapsed_list = self.elapsed.tolist()
+
+    @classmethod
+    def from_track(cls, track, ticks_per_beat):
+        changes = []
+        tick    = 0
+        for msg in track:
+            tick = tick + msg.time
+            if msg.type == constants.META_SET_TEMPO:
+                changes.append((tick, msg.tempo))
+
+        return cls(ticks_per_beat, changes)
+
+    def to_microseconds(self, ticks):
+        # convert absolute tick positions to integer microseconds in one vectorized pass
+        ticks = np.asarray(ticks, dtype=np.float64)
+        index = np.searchsorted(self.ticks, ticks, side="right") - 1
+
+        elapsed = self.elapsed[index] + (ticks - self.ticks[index]) * self.tempos[index]
+        return (elapsed // self.ticks_per_beat).astype(np.int64)
+
+    def get_microseconds(self, ticks):
+        # scalar counterpart of to_microseconds giving the very same result
+        index   = bisect.bisect_right(self.tick_list, ticks) - 1
+        elapsed = self.elapsed_list[index] + (ticks - self.tick_list[index]) * self.tempo_list[index]
+        return int(elapsed // self.ticks_per_beat)
+
+    def get_key(self):
+        return [self.ticks.tolist(), self.tempos.tolist()]
+
+class BarIndex:
+    # bar lines of a song for every time signature change: the tick where each time signature starts,
+    # its bar length in ticks and the number of the first bar it starts with
+    def __init__(self, ticks_per_beat, changes=()):
+        starts  = [0]
+        lengths = [utils.get_default_time_signature_ticks(ticks_per_beat, 1)]
+        bars    = [0]
+
+        for tick, time_signature in sorted(changes, key=lambda change: change[0]):
+            length = utils.get_time_signature_ticks(time_signature, ticks_per_beat, 1)
+            if tick == starts[-1]:
+                lengths[-1] = length
+                continue
+
+            # a time signature changing within a bar starts a new bar
+            bar = bars[-1] + int(np.ceil((tick - starts[-1]) / lengths[-1]))
+            starts.append(tick)
+            lengths.append(length)
+            bars.append(bar)
+
+        self.starts  = np.array(starts, dtype=np.float64)
+        self.lengths = np.array(lengths, dtype=np.float64)
+        self.bars    = np.array(bars, dtype=np.int64)
+
+        self.start_list  = starts
+        self.length_list = lengths
+        self.bar_list    = bars
+
+    @classmethod
+    def from_track(cls, track, ticks_per_beat):
+        changes = []
+        tick    = 0
+        for msg in track:
+            tick = tick + msg.time
+            if msg.type == constants.META_TIME_SIGNATUR:
+                changes.append((tick, msg))
+
+        return cls(ticks_per_beat, changes)
+
+    def get_offset(self, ticks):
+        # ticks since the start of the bar and the length of the bar the given position is part of
+        index  = bisect.bisect_right(self.start_list, ticks) - 1
+        length = self.length_list[index]
+        return (ticks - self.start_list[index]) % length, length
+
+    def get_bars(self, ticks):
+        # zero based bar numbers of a whole array of tick positions
+        ticks = np.asarray(ticks, dtype=np.float64)
+        index = np.searchsorted(self.starts, ticks, side="right") - 1
+        return self.bars[index] + ((ticks - self.starts[index]) // self.lengths[index]).astype(np.int64)
+
+    def get_bar(self, ticks):
+        # scalar counterpart of get_bars
+        index = bisect.bisect_right(self.start_list, ticks) - 1
+        return self.bar_list[index] + int((ticks - self.start_list[index]) // self.length_list[index])
+
+    def get_tick(self, bar):
+        # the tick the given zero based bar starts at
+        index = bisect.bisect_right(self.bar_list, bar) - 1
+        return self.start_list[index] + (bar - self.bar_list[index]) * self.length_list[index]
+
+    def get_case_ticks(self, case, measures):
+        # [start, end) of a case in ticks, the single case of measures zero spans the whole song
+        if measures == 0:
+            return 0, float("inf")
+
+        return self.get_tick((case - 1) * measures), self.get_tick(case * measures)
+
+    def get_key(self):
+        return [self.starts.tolist(), self.lengths.tolist()]
+
+def get_case(bar, measures):
+    return 1 if measures == 0 else bar // measures + 1
+
+def get_cases(bars, measures):
+    # case ids for a granularity of the given number of measures, zero puts everything into one case
+    bars = np.asarray(bars, dtype=np.int64)
+    if measures == 0:
+        return np.ones(len(bars), dtype=np.int64)
+
+    return bars // measures + 1
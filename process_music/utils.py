@@ -1,9 +1,14 @@
 import mido
 import constants
+import profiling
 
 import numpy as np
 
-import sys
+import datetime
+
+class ProcessMusicError(Exception):
+    # raised for MIDI content that cannot be processed, so callers can skip the file instead of exiting
+    pass
 
 def order_note_types(note_types, ticks, ticks_per_beat, threshold):
     note_types_ordered = []
@@ -40,131 +45,112 @@ def order_note_types(note_types, ticks, ticks_per_beat, threshold):
 
     return note_types_ordered
 
-def _adapt_ratio(ratio, ticks, ticks_per_beat, note_types):
-    bounds    = list(note_types.values())
-    old_ticks = ticks
-    old_ratio = ratio 
-
-    middles = []
-    for bound in bounds:
-        middle = (bound[0] + bound[1]) / 2
-        if middle * 0.9 <= ratio <= middle * 1.1:
-            middles.append(middle)
-
-    if len(middles) > 0:
-        minimum_difference = np.argmin(np.abs(np.array(middles) - ratio))
-        ticks              = ticks_per_beat * middles[minimum_difference]
-        ratio              = ticks / ticks_per_beat
-
-        if __debug__:
-            print(f"adapt tick-ratio [old, new] \t tracks [{old_ratio}, {ratio}] \t ticks [{old_ticks}, {ticks}]")
-
-    return ratio
-
-def _get_note_type_pause(ticks, ticks_per_beat, note_types):
-    ratio = ticks / ticks_per_beat
-    if ratio < constants.NOTE_LOWER_BOUND:
-        return ["unknown"]
-
-    if ratio > np.max(list(note_types.values())):
-        typez = []
-
-        while True:
-            if ratio < constants.NOTE_LOWER_BOUND:
-                break
-
-            for key, bound in note_types.items():
-                if "dotted" in key:
-                    continue
-
-                middle = bound[0]
-                if (ratio - middle) >= 0:
-                    ratio = ratio - middle
-                    typez.append(key)
-                    break
-
-        return typez
-
-    adapted_ratio = _adapt_ratio(ratio, ticks, ticks_per_beat, note_types)
-    typez = [*filter(lambda x: note_types[x][0] < adapted_ratio <= note_types[x][1], note_types.keys())]
-    if len(typez) > 0:
-        return [typez[0]]
-
-    print(f"could not determine note type for ticks - ratio: {ticks} - {ratio}")
-
-    # i = 1
-    # adapted = False
-    # while True:
-    #     adapted_ratio = ratio / i
-    #     typez = [*filter(lambda x: note_types[x][0] < adapted_ratio <= note_types[x][1], note_types.keys())]
-    #     if len(typez) > 0:
-    #         return (i, typez[0])
-
-    #     i = i + 1
-
-    #     # adjust tick ratio 
-    #     if i > constants.MAX_ATTEMPTS_ADAPTATION:
-    #         if adapted == True:
-    #             print(f"could not adapt ratio correctly for ratio {ratio}")
-    #             sys.exit(1)
-
-    #         ratio   = _adapt_ratio(ratio, ticks, ticks_per_beat, note_types)
-    #         adapted = True
-    #         i       = 1
-    #         continue
-
-def _get_note_type(ticks, ticks_per_beat, note_types):
-    ratio = ticks / ticks_per_beat
-    if ratio < constants.NOTE_LOWER_BOUND:
-        return (0, "unknown")
-
-    i = 1
-    adapted = False
-    while True:
-        adapted_ratio = ratio / i
-        typez = [*filter(lambda x: note_types[x][0] < adapted_ratio <= note_types[x][1], note_types.keys())]
-        if len(typez) > 0:
-            return (i, typez[0])
-
-        i = i + 1
-
-        # adjust tick ratio 
-        if i > constants.MAX_ATTEMPTS_ADAPTATION:
-            if adapted == True:
-                print(f"could not adapt ratio correctly for ratio {ratio}")
-                sys.exit(1)
-
-            bounds    = list(note_types.values())
-            old_ticks = ticks
-            old_ratio = ratio 
-
-            middles = []
-            for bound in bounds:
-                middle = (bound[0] + bound[1]) / 2
-                if middle * 0.9 <= ratio <= middle * 1.1:
-                    middles.append(middle)
-            if len(middles) > 0:
-                minimum_difference = np.argmin(np.abs(np.array(middles) - ratio))
-                ticks              = ticks_per_beat * middles[minimum_difference]
-                ratio              = ticks / ticks_per_beat
-
-            if __debug__:
-                print(f"adapt tick-ratio [old, new] \t tracks [{old_ratio}, {ratio}] \t ticks [{old_ticks}, {ticks}]")
-
-            adapted = True
-            i       = 1
-            continue
+def _lookup_note_types(ratios, lookup):
+    # index of the first note type with lower < ratio <= upper, -1 if there is none
+    return lookup.labels[np.searchsorted(lookup.edges, ratios, side="left")]
+
+def _adapt_ratios(ratios, ticks, ticks_per_beat, lookup):
+    # snap each ratio to the closest note type middle within a window of +-10%
+    middles = lookup.middles
+    window  = (middles * 0.9 <= ratios[:, None]) & (ratios[:, None] <= middles * 1.1)
+    closest = np.argmin(np.where(window, np.abs(middles - ratios[:, None]), np.inf), axis=1)
+    adapt   = window.any(axis=1)
+
+    adapted_ticks  = np.where(adapt, ticks_per_beat * middles[closest], ticks)
+    adapted_ratios = np.where(adapt, adapted_ticks / ticks_per_beat, ratios)
+    profiling.count("ratio_adaptations", int(np.count_nonzero(adapt)))
+
+    if __debug__:
+        for old_ratio, ratio, old_ticks, new_ticks in zip(ratios[adapt], adapted_ratios[adapt], ticks[adapt], adapted_ticks[adapt]):
+            print(f"adapt tick-ratio [old, new] \t tracks [{old_ratio}, {ratio}] \t ticks [{old_ticks}, {new_ticks}]")
+
+    return adapted_ratios
+
+def _get_note_types_pause(ticks, ticks_per_beat, lookup):
+    ratios = ticks / ticks_per_beat
+    typez  = [None] * len(ratios)
+
+    unknown = ratios < constants.NOTE_LOWER_BOUND
+    for i in np.flatnonzero(unknown):
+        typez[i] = [constants.UNKNOWN_NOTE_TYPE]
+
+    # pauses longer than any note type are broken down greedily into plain (non-dotted) note types
+    # taking the first one in definition order whose lower bound still fits into the remaining ratio
+    long_pauses = np.flatnonzero(~unknown & (ratios > np.max(lookup.upper)))
+    for i in long_pauses:
+        typez[i] = []
+
+    plain     = np.flatnonzero(lookup.plain)
+    remaining = ratios[long_pauses]
+    active    = np.arange(len(long_pauses))
+    while len(active) > 0:
+        active = active[remaining[active] >= constants.NOTE_LOWER_BOUND]
+        fits   = (remaining[active, None] - lookup.lower[plain]) >= 0
+        chosen = plain[np.argmax(fits, axis=1)]
+        active = active[fits.any(axis=1)]
+        chosen = chosen[fits.any(axis=1)]
+
+        remaining[active] = remaining[active] - lookup.lower[chosen]
+        for i, label in zip(active, chosen):
+            typez[long_pauses[i]].append(lookup.names[label])
+
+    regular = np.flatnonzero(~unknown & (ratios <= np.max(lookup.upper)))
+    labels  = _lookup_note_types(_adapt_ratios(ratios[regular], ticks[regular], ticks_per_beat, lookup), lookup)
+    for i, label in zip(regular, labels):
+        if label >= 0:
+            typez[i] = [lookup.names[label]]
+        else:
+            print(f"could not determine note type for ticks - ratio: {ticks[i]} - {ratios[i]}")
+
+    return typez
+
+def _get_note_types(ticks, ticks_per_beat, lookup):
+    ratios = ticks / ticks_per_beat
+    typez  = [(0, constants.UNKNOWN_NOTE_TYPE)] * len(ratios)
+
+    # try all divisors for all ratios at once, the first divisor with a matching note type wins.
+    # ratios without any match are adapted to the closest note type once and tried again
+    divisors = np.arange(1, constants.MAX_ATTEMPTS_ADAPTATION + 1)
+    pending  = np.flatnonzero(ratios >= constants.NOTE_LOWER_BOUND)
+    adapted  = False
+    while len(pending) > 0:
+        labels = _lookup_note_types(ratios[pending, None] / divisors, lookup)
+        found  = labels >= 0
+        first  = np.argmax(found, axis=1)
+
+        for i, divisor, label in zip(pending, divisors[first], labels[np.arange(len(pending)), first]):
+            if label >= 0:
+                typez[i] = (int(divisor), lookup.names[label])
+
+        pending = pending[~found.any(axis=1)]
+        if len(pending) == 0:
+            break
+
+        if adapted:
+            raise ProcessMusicError(f"could not adapt ratio correctly for ratio {ratios[pending[0]]}")
+
+        ratios          = ratios.copy()
+        ratios[pending] = _adapt_ratios(ratios[pending], ticks[pending], ticks_per_beat, lookup)
+        adapted         = True
+
+    return typez
+
+def get_note_types(ticks, ticks_per_beat):
+    # classify a whole batch of durations, duplicates are classified only once
+    values, inverse = np.unique(np.asarray(ticks), return_inverse=True)
+    typez = _get_note_types(values, ticks_per_beat, constants.NOTE_TYPES_LOOKUP)
+    return [typez[i] for i in inverse]
+
+def get_note_types_pause(ticks, ticks_per_beat):
+    values, inverse = np.unique(np.asarray(ticks), return_inverse=True)
+    typez = _get_note_types_pause(values, ticks_per_beat, constants.NOTE_TYPES_PAUSE_LOOKUP)
+    return [None if typez[i] is None else [*typez[i]] for i in inverse]
 
 def get_note_type(ticks, ticks_per_beat):
-    return _get_note_type(ticks, ticks_per_beat, constants.NOTE_TYPES)
+    return get_note_types([ticks], ticks_per_beat)[0]
 
 def get_note_type_pause(ticks, ticks_per_beat):
-    note_types = constants.NOTE_TYPES.copy()
-
-    del note_types[f"double dotted {constants.NOTE_WHOLE}"]
-    del note_types[f"dotted {constants.NOTE_WHOLE}"]
-    
-    return _get_note_type_pause(ticks, ticks_per_beat, note_types)
+    return get_note_types_pause([ticks], ticks_per_beat)[0]
 
 def get_note_before(note):
     notes = np.array(constants.NOTES)
@@ -195,13 +181,15 @@ def get_key(note):
     
     return f"{name}{octave}"
 
+# the names of all 128 MIDI notes, looked up instead of formatted for every event
+KEYS = [get_key(note) for note in range(128)]
+
 def get_time_signature_ticks(time_signature, ticks_per_beat, measures):
     numerator   = time_signature.numerator
     denominator = time_signature.denominator
 
     if not denominator in constants.SIGNATURE_UNIT.keys():
-        print(f"invalid denominator / signature: {time_signature}")
-        sys.exit(1)
+        raise ProcessMusicError(f"invalid denominator / signature: {time_signature}")
 
     unit        = constants.SIGNATURE_UNIT[denominator]
     ratio_lower = constants.NOTE_TYPES[unit][0]
@@ -212,6 +200,16 @@ def get_default_time_signature_ticks(ticks_per_beat, measures):
     meta = mido.MetaMessage("time_signature", numerator=4, denominator=4)
     return get_time_signature_ticks(meta, ticks_per_beat, measures)
 
+def parse_measures(value):
+    # several granularities are given comma separated, e.g. 1,2,4,8,0
+    return [int(measures) for measures in str(value).split(",")]
+
+def parse_formats(value):
+    return [output_format.strip() for output_format in str(value).split(",")]
+
+def format_timestamp(start, microseconds):
+    return adapt_iso_time(start + datetime.timedelta(microseconds=microseconds))
+
 def adapt_iso_time(now):
     # small bug in python: with zero microseconds, the identifier will not be printed resulting in an inconsistent
     # timestamp. solve by using the default value
@@ -1,25 +1,142 @@
-from pm4py.objects.log.adapters.pandas import csv_import_adapter
-from pm4py.objects.conversion.log import factory as conversion_factory
-from pm4py.objects.log.exporter.xes import factory as xes_exporter
-
-import pandas
-
-import os
-import sys
-
-def export_to_xes(filename):
-    output = os.path.splitext(filename)[0].lower()
-
-    df = csv_import_adapter.import_dataframe_from_path(filename, sep=";")
-    df = df.rename(columns={
-        "Case_ID":  "case:concept:name", 
-        "Event":    "concept:name",
-        "Type":     "org:type",
-        "Order":    "org:order",
-        "Is_Chord": "org:is_chord"
-    })
-
-    # create internal XES log from pandas dataframe
-    log = conversion_factory.apply(df)
-    # save XES log
-    xes_exporter.export_log(log, f"{output}.xes")
+from xml.sax.saxutils import quoteattr
+
+import store
+import utils
+
+import gzip
+
+XES_HEADER = "<?xml version='1.0' encoding='UTF-8'?>\n<log>\n  <string key=\"origin\" value=\"csv\"/>\n"
+XES_FOOTER = "</log>\n"
+
+TRACE_START = "  <trace>\n    <int key=\"concept:name\" value={case}/>\n"
+TRACE_END   = "  </trace>\n"
+
+EVENT = (
+    "    <event>\n"
+    "      <string key=\"concept:name\" value={key}/>\n"
+    "      <string key=\"org:type\" value={type}/>\n"
+    "      <int key=\"org:order\" value=\"{order}\"/>\n"
+    "      <boolean key=\"org:is_chord\" value=\"{is_chord}\"/>\n"
+    "      <date key=\"Timestamp\" value=\"{time}\"/>\n"
+    "    </event>\n"
+)
+
+# events of a song log carry the track and its name next to the attributes of a track log
+SONG_EVENT = (
+    "    <event>\n"
+    "      <string key=\"concept:name\" value={key}/>\n"
+    "      <string key=\"org:type\" value={type}/>\n"
+    "      <int key=\"org:order\" value=\"{order}\"/>\n"
+    "      <boolean key=\"org:is_chord\" value=\"{is_chord}\"/>\n"
+    "      <date key=\"Timestamp\" value=\"{time}\"/>\n"
+    "      <int key=\"org:track\" value=\"{track}\"/>\n"
+    "      <string key=\"org:instrument\" value={instrument}/>\n"
+    "    </event>\n"
+)
+
+def adapt_xes_time(time):
+    # XES dates carry milliseconds and a timezone, e.g. 2020-01-15T00:00:00.125+00:00
+    return f"{time[:23]}+00:00"
+
+class XesWriter:
+    # writes a XES log event by event. a new trace is opened whenever the case of the incoming event changes,
+    # so only the current case is kept in memory and the events have to arrive grouped by case
+    def __init__(self, filename, start, compress=False):
+        if compress:
+            if not filename.endswith(".gz"):
+                filename = f"{filename}.gz"
+            self.fh = gzip.open(filename, "wt", encoding="utf-8", compresslevel=6)
+        else:
+            self.fh = open(filename, "w", encoding="utf-8")
+
+        self.filename = filename
+        self.start    = start
+        self.case     = None
+
+        self.fh.write(XES_HEADER)
+
+    def switch_case(self, case):
+        if self.case is not None:
+            self.fh.write(TRACE_END)
+
+        self.case = case
+        self.fh.write(TRACE_START.format(case=quoteattr(str(case))))
+
+    def write(self, event):
+        if event.case != self.case:
+            self.switch_case(event.case)
+
+        self.fh.write(EVENT.format(
+            key      = quoteattr(event.key),
+            type     = quoteattr(event.type),
+            order    = event.order,
+            is_chord = event.is_chord,
+            time     = adapt_xes_time(utils.format_timestamp(self.start, event.time))
+        ))
+
+    def write_song_event(self, event, track, instrument):
+        if event.case != self.case:
+            self.switch_case(event.case)
+
+        self.fh.write(SONG_EVENT.format(
+            key        = quoteattr(event.key),
+            type       = quoteattr(event.type),
+            order      = event.order,
+            is_chord   = event.is_chord,
+            time       = adapt_xes_time(utils.format_timestamp(self.start, event.time)),
+            track      = track,
+            instrument = quoteattr(instrument)
+        ))
+
+    def write_table(self, table):
+        # keys and note types are categorical, so each of them is escaped once instead of per event
+        keys    = [quoteattr(key) for key in table.get_keys()]
+        types   = [quoteattr(note_type) for note_type in table.types]
+        columns = zip(table.key.tolist(), table.type.tolist(), table.case.tolist(), table.order.tolist(),
+                      table.is_chord.tolist(), table.time.tolist())
+
+        for key, note_type, case, order, is_chord, time in columns:
+            if case != self.case:
+                self.switch_case(case)
+
+            self.fh.write(EVENT.format(
+                key      = keys[key],
+                type     = types[note_type],
+                order    = order,
+                is_chord = is_chord,
+                time     = adapt_xes_time(utils.format_timestamp(self.start, time))
+            ))
+
+    def close(self):
+        if self.case is not None:
+            self.fh.write(TRACE_END)
+
+        self.fh.write(XES_FOOTER)
+        self.fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def group_by_case(events):
+    # notes are logged at their note_off but belong to the case of their note_on, so the events of
+    # a case are not necessarily next to each other. cases keep the order of their first event
+    cases = {}
+    for event in events:
+        cases.setdefault(event.case, []).append(event)
+
+    for case_events in cases.values():
+        yield from case_events
+
+def export_to_xes(events, filename, start, compress=False):
+    # events are either an iterable of processor.Event or a store.EventTable
+    with XesWriter(filename, start, compress) as writer:
+        if isinstance(events, store.EventTable):
+            writer.write_table(events.group_by_case())
+        else:
+            for event in group_by_case(events):
+                writer.write(event)
+
+    return writer.filename
@@ -1,6 +1,54 @@
 set -e
 
+root=$(pwd)
+out=$(mktemp -d)
+trap 'rm -rf ${out}' EXIT
+
+song=examples/Boss_Fight_in_E_Minor.mid
+
+# the batch classification of durations has to match the original per-duration search
+python3 -O tests/check_note_types.py
+
+# every case of a track log is a single trace of its XES log, also when its notes are held into later cases
+python3 -O process_music/process_music.py --output_dir ${out}/traces --measures 1,2 --formats csv,xes tests/held_notes.mid
+python3 -O process_music/process_music.py --output_dir ${out}/traces/song --measures 1,2 --formats csv,xes ${song}
+python3 -O tests/check_traces.py ${out}/traces
+
+# a corpus of the examples processed in parallel
+python3 -O process_music/batch.py --output_dir ${out}/batch --jobs 2 --formats csv,footprint,npz,counts examples
+
+# the second run restores every track from the cache
+python3 -O process_music/process_music.py --output_dir ${out}/cached --cache_dir ${out}/cache ${song}
+python3 -O process_music/process_music.py --output_dir ${out}/cached --cache_dir ${out}/cache ${song} | grep "0 misses"
+
+python3 -O process_music/process_music.py --output_dir ${out}/song --measures 1,2 --formats csv,xes,footprint,npz,counts --merge ${song}
+python3 -O process_music/process_music.py --output_dir ${out}/song/held --measures 1,2 --formats csv,xes --merge tests/held_notes.mid
+python3 -O tests/check_traces.py ${out}/song
+
+(cd ${out} && python3 -O ${root}/process_music/aggregate.py --types batch)
+
+python3 -O process_music/motif.py add ${out}/motifs ${out}/batch
+python3 -O process_music/motif.py search ${out}/motifs E4 D4 C4 B3 A3
+python3 -O process_music/motif.py search --near --intervals 2,2,-4,1 ${out}/motifs
+
+python3 -O process_music/process_music.py --output_dir ${out}/chords --chords ${song}
+
+python3 -O process_music/process_music.py --output_dir ${out}/sonorities --measures 1,2 --sonorities ${song}
+python3 -O tests/check_traces.py ${out}/sonorities
+python3 -O process_music/intervals.py sounding ${song} 1920
+python3 -O process_music/intervals.py case --measures 2 ${song} 3
+
+python3 -O process_music/live.py replay --speed 0 --quiet --output_dir ${out}/live ${song}
+python3 -O process_music/live.py replay --speed 0 --quiet --output_dir ${out}/live/shared examples/Progression_in_E_Minor.mid
+python3 -O process_music/live.py replay --speed 0 --quiet --output_dir ${out}/live/held tests/held_notes.mid
+python3 -O tests/check_traces.py ${out}/live
+printf "note_on channel=0 note=60 velocity=64 time=0\nnote_off channel=0 note=60 velocity=0 time=480\n" | python3 -O process_music/live.py stdin --quiet --output_dir ${out}/stdin
+
+python3 -O process_music/conformance.py --output ${out}/fitness.csv ${out}/corpus_footprint_matrix.txt ${out}/batch
+
+python3 -O process_music/process_music.py --output_dir ${out}/channels --split_channels --gzip ${song}
+
 for midi in examples/*.mid
-do 
+do
     python3 -O process_music/process_music.py ${midi}
-done
\ No newline at end of file
+done
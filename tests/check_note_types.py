@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+"""Process Music note type check. Compare the batch classification of durations with the original per-duration search
+
+Usage:
+    check_note_types.py [--max_ticks MAX_TICKS] [--ticks_per_beat TPB]
+    check_note_types.py (-h | --help)
+
+Options:
+    -h --help               Show help.
+    --max_ticks MAX_TICKS   Every duration from 0 up to this number of ticks is classified [default: 2000].
+    --ticks_per_beat TPB    Comma separated resolutions the durations are classified with [default: 96,120,192,384,480,960].
+
+The reference below is the scalar search of get_note_type and get_note_type_pause before they were turned into
+single value wrappers of the lookup table. Its debug output is left out and the exit on a ratio which cannot be
+adapted is reported as error, like utils.ProcessMusicError of the batch classification.
+
+Copyright:
+    (c) by K-u-K (imperial Keller Patrick & royal Kocaj Alen) 2020
+"""
+from docopt import docopt
+from schema import Schema, And, Use, SchemaError
+
+import numpy as np
+
+import contextlib
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "process_music"))
+
+import constants
+import utils
+
+ERROR = "error"
+
+def reference_adapt_ratio(ratio, ticks, ticks_per_beat, note_types):
+    middles = []
+    for bound in note_types.values():
+        middle = (bound[0] + bound[1]) / 2
+        if middle * 0.9 <= ratio <= middle * 1.1:
+            middles.append(middle)
+
+    if len(middles) > 0:
+        minimum_difference = np.argmin(np.abs(np.array(middles) - ratio))
+        ticks              = ticks_per_beat * middles[minimum_difference]
+        ratio              = ticks / ticks_per_beat
+
+    return ratio
+
+def reference_note_type(ticks, ticks_per_beat):
+    note_types = constants.NOTE_TYPES
+    ratio      = ticks / ticks_per_beat
+    if ratio < constants.NOTE_LOWER_BOUND:
+        return (0, constants.UNKNOWN_NOTE_TYPE)
+
+    i = 1
+    adapted = False
+    while True:
+        adapted_ratio = ratio / i
+        typez = [*filter(lambda x: note_types[x][0] < adapted_ratio <= note_types[x][1], note_types.keys())]
+        if len(typez) > 0:
+            return (i, typez[0])
+
+        i = i + 1
+        if i > constants.MAX_ATTEMPTS_ADAPTATION:
+            if adapted:
+                return ERROR
+
+            ratio   = reference_adapt_ratio(ratio, ticks, ticks_per_beat, note_types)
+            adapted = True
+            i       = 1
+
+def reference_note_type_pause(ticks, ticks_per_beat):
+    note_types = constants.NOTE_TYPES.copy()
+    del note_types[f"double dotted {constants.NOTE_WHOLE}"]
+    del note_types[f"dotted {constants.NOTE_WHOLE}"]
+
+    ratio = ticks / ticks_per_beat
+    if ratio < constants.NOTE_LOWER_BOUND:
+        return [constants.UNKNOWN_NOTE_TYPE]
+
+    if ratio > np.max(list(note_types.values())):
+        typez = []
+        while ratio >= constants.NOTE_LOWER_BOUND:
+            for key, bound in note_types.items():
+                if "dotted" not in key and (ratio - bound[0]) >= 0:
+                    ratio = ratio - bound[0]
+                    typez.append(key)
+                    break
+            else:
+                # no plain note type fits the rest, the original search would not end here
+                break
+
+        return typez
+
+    adapted_ratio = reference_adapt_ratio(ratio, ticks, ticks_per_beat, note_types)
+    typez = [*filter(lambda x: note_types[x][0] < adapted_ratio <= note_types[x][1], note_types.keys())]
+    if len(typez) > 0:
+        return [typez[0]]
+
+    return None
+
+def classify(function, *args):
+    try:
+        return function(*args)
+    except utils.ProcessMusicError:
+        return ERROR
+
+def check(ticks_per_beat, max_ticks):
+    # the scalar wrappers against the reference, the batch against the scalar wrappers. returns the mismatches
+    durations  = [*range(max_ticks + 1)]
+    mismatches = []
+    for kind, batch, scalar, reference in [
+        ("note",  utils.get_note_types,       utils.get_note_type,       reference_note_type),
+        ("pause", utils.get_note_types_pause, utils.get_note_type_pause, reference_note_type_pause)
+    ]:
+        # a batch with a duration which cannot be adapted fails as a whole, it is compared without them
+        scalars  = [classify(scalar, ticks, ticks_per_beat) for ticks in durations]
+        valid    = [ticks for ticks, value in zip(durations, scalars) if value != ERROR]
+        batches  = dict(zip(valid, batch(valid, ticks_per_beat)))
+
+        for ticks, value in zip(durations, scalars):
+            expected = reference(ticks, ticks_per_beat)
+            if value != expected:
+                mismatches.append(f"{kind} ticks={ticks} ticks_per_beat={ticks_per_beat}: {value} instead of {expected}")
+            elif ticks in batches and batches[ticks] != value:
+                mismatches.append(f"{kind} ticks={ticks} ticks_per_beat={ticks_per_beat}: batch {batches[ticks]} instead of {value}")
+
+    return mismatches
+
+def main(args):
+    mismatches = []
+    for ticks_per_beat in args["--ticks_per_beat"]:
+        # durations without any note type are reported on the console, which is of no interest here
+        with contextlib.redirect_stdout(io.StringIO()):
+            mismatches.extend(check(ticks_per_beat, args["--max_ticks"]))
+
+    for mismatch in mismatches[:20]:
+        print(mismatch)
+
+    if len(mismatches) > 0:
+        print(f"{len(mismatches)} durations classified differently")
+        sys.exit(1)
+
+    print(f"Durations up to {args['--max_ticks']} ticks classified the same for {len(args['--ticks_per_beat'])} resolutions")
+
+if __name__ == '__main__':
+    args   = docopt(__doc__)
+    schema = Schema({
+        "--max_ticks": And(Use(int), lambda x: x >= 0, error="Max ticks should be a positive number"),
+        "--ticks_per_beat": And(Use(lambda x: [int(value) for value in x.split(",")]), lambda x: all(value > 0 for value in x), error="Ticks per beat should be a comma separated list of positive numbers"),
+        "--help": bool
+    })
+
+    try:
+        args = schema.validate(args)
+    except SchemaError as e:
+        print("Warning: invalid arguments given", e, "\n")
+        print(__doc__)
+        sys.exit(1)
+
+    main(args)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+"""Process Music trace check. Compare the traces of XES logs with the cases of the CSV logs written next to them
+
+Usage:
+    check_traces.py <log_dir>...
+    check_traces.py (-h | --help)
+
+Options:
+    -h --help               Show help.
+
+Every case has to be a single trace. The traces follow the cases in the order of their first event in the CSV log
+and hold the events of their case in the order of the CSV log, like the conversion of the CSV log with pm4py did.
+
+Copyright:
+    (c) by K-u-K (imperial Keller Patrick & royal Kocaj Alen) 2020
+"""
+from docopt import docopt
+from schema import Schema, And, SchemaError
+
+import xml.etree.ElementTree as ET
+
+import csv
+import gzip
+import os
+import sys
+
+def open_log(filename):
+    if filename.endswith(".gz"):
+        return gzip.open(filename, "rt", encoding="utf-8")
+    return open(filename, encoding="utf-8")
+
+def read_csv_cases(filename):
+    cases = {}
+    with open_log(filename) as fh:
+        for row in csv.DictReader(fh, delimiter=";"):
+            cases.setdefault(row["Case_ID"], []).append((row["Event"], row["Type"], row["Order"]))
+    return cases
+
+def get_value(element, key):
+    for child in element:
+        if child.get("key") == key:
+            return child.get("value")
+    return None
+
+def read_xes_traces(filename):
+    traces = []
+    with open_log(filename) as fh:
+        for _, element in ET.iterparse(fh):
+            if element.tag == "trace":
+                events = [(get_value(event, "concept:name"), get_value(event, "org:type"), get_value(event, "org:order")) for event in element.iter("event")]
+                traces.append((get_value(element, "concept:name"), events))
+                element.clear()
+    return traces
+
+def find_logs(log_dirs):
+    for log_dir in log_dirs:
+        for root, _, files in os.walk(log_dir):
+            for name in sorted(files):
+                if name.endswith(".xes") or name.endswith(".xes.gz"):
+                    xes_file = os.path.join(root, name)
+                    csv_file = xes_file.replace(".xes", ".csv")
+                    if os.path.exists(csv_file):
+                        yield xes_file, csv_file
+
+def check_log(xes_file, csv_file):
+    errors = []
+    traces = read_xes_traces(xes_file)
+    cases  = read_csv_cases(csv_file)
+    names  = [name for name, _ in traces]
+
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if len(duplicates) > 0:
+        errors.append(f"{xes_file}: {len(traces)} traces for {len(set(names))} cases, split cases {', '.join(duplicates)}")
+    elif names != [*cases]:
+        errors.append(f"{xes_file}: traces {len(names)} do not follow the {len(cases)} cases of {csv_file}")
+    else:
+        for name, events in traces:
+            if events != cases[name]:
+                errors.append(f"{xes_file}: events of trace {name} differ from {csv_file}")
+
+    return len(traces), errors
+
+def main(args):
+    logs   = 0
+    traces = 0
+    errors = []
+    for xes_file, csv_file in find_logs(args["<log_dir>"]):
+        count, log_errors = check_log(xes_file, csv_file)
+        logs   = logs + 1
+        traces = traces + count
+        errors.extend(log_errors)
+
+    if len(errors) > 0:
+        for error in errors:
+            print(error)
+        sys.exit(1)
+
+    if logs == 0:
+        print("No XES logs with a CSV log found")
+        sys.exit(1)
+
+    print(f"{traces} traces of {logs} XES logs match their cases")
+
+if __name__ == '__main__':
+    args   = docopt(__doc__)
+    schema = Schema({
+        "<log_dir>": [And(os.path.isdir, error="Log directories should exist")],
+        "--help":    bool
+    })
+
+    try:
+        args = schema.validate(args)
+    except SchemaError as e:
+        print("Warning: invalid arguments given", e, "\n")
+        print(__doc__)
+        sys.exit(1)
+
+    main(args)